@@ -0,0 +1,48 @@
+"""Персональные фрагменты страниц, закэшированных для всех.
+
+Страница из кэша одна на всех пользователей. Места, которые зависят от
+пользователя (меню, кнопки автора, форма комментария), при рендеринге
+такой «оболочки» заменяются метками; на каждый запрос метки заполняются
+небольшими шаблонами уже для текущего пользователя. Текст постов
+и комментариев экранируется, поэтому подделать метку через них нельзя.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+HOLE = re.compile(r'<!--hole:([\w=-]+)-->')
+MEMBERS_ONLY = re.compile(r'<!--members-->(.*?)<!--/members-->', re.S)
+MARKERS = (b'<!--hole:', b'<!--members-->')
+
+
+def is_shell(request):
+    """Рендерится ли сейчас общая для всех оболочка страницы."""
+    return getattr(request, 'page_shell', False)
+
+
+def placeholder(template_name, args):
+    payload = json.dumps([template_name, args]).encode()
+    return f'<!--hole:{base64.urlsafe_b64encode(payload).decode()}-->'
+
+
+def render_hole(template_name, args, request):
+    return render_to_string(template_name, args, request)
+
+
+def fill(response, request):
+    """Заполняет метки оболочки фрагментами для текущего пользователя."""
+    if not any(marker in response.content for marker in MARKERS):
+        return response
+
+    def hole(match):
+        template_name, args = json.loads(base64.urlsafe_b64decode(match[1]))
+        return render_hole(template_name, args, request)
+
+    content = HOLE.sub(hole, response.content.decode(response.charset))
+    content = MEMBERS_ONLY.sub(
+        r'\1' if request.user.is_authenticated else '', content
+    )
+    response.content = content
+    return response
@@ -0,0 +1,41 @@
+import os
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.management.base import BaseCommand
+
+
+def cache_usage(backend):
+    if isinstance(backend, FileBasedCache):
+        files = backend._list_cache_files()
+        size = sum(os.path.getsize(name) for name in files)
+        return {'entries': len(files), 'bytes': size}
+    if isinstance(backend, LocMemCache):
+        return {'entries': len(backend._cache)}
+    if isinstance(backend, BaseMemcachedCache):
+        usage = {}
+        for server, stats in backend._cache.get_stats():
+            for name in ('curr_items', 'bytes', 'get_hits', 'get_misses'):
+                usage[f'{server} {name}'] = stats.get(name)
+        return usage
+    return {}
+
+
+class Command(BaseCommand):
+    help = 'Показывает настройки и заполненность кэшей'
+
+    def handle(self, *args, **options):
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            self.stdout.write(
+                f'{alias}: {backend.__class__.__name__}, '
+                f'префикс {backend.key_prefix!r}, версия {backend.version}'
+            )
+            usage = cache_usage(backend)
+            if not usage:
+                self.stdout.write('  статистика недоступна')
+            for name, value in usage.items():
+                self.stdout.write(f'  {name}: {value}')
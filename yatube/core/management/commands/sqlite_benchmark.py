@@ -0,0 +1,136 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.signals import apply_pragmas
+from yatube.settings import SQLITE_PRAGMAS
+
+POSTS = 1000
+SCHEMA = '''
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    comments_count INTEGER NOT NULL
+);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    text TEXT NOT NULL,
+    pub_date REAL NOT NULL
+);
+CREATE INDEX comment_post_pub_date ON comment (post_id, pub_date);
+'''
+
+
+def read(connection, post_id):
+    connection.execute(
+        'SELECT * FROM post WHERE id = ?', (post_id,)
+    ).fetchall()
+    connection.execute(
+        'SELECT * FROM comment WHERE post_id = ? '
+        'ORDER BY pub_date DESC LIMIT 20', (post_id,)
+    ).fetchall()
+
+
+def write(connection, post_id):
+    """Как add_comment: комментарий и счётчик в одной транзакции."""
+    connection.execute('BEGIN')
+    try:
+        connection.execute(
+            'INSERT INTO comment (post_id, text, pub_date) VALUES (?, ?, ?)',
+            (post_id, 'Комментарий', time.time())
+        )
+        connection.execute(
+            'UPDATE post SET comments_count = comments_count + 1 '
+            'WHERE id = ?', (post_id,)
+        )
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+
+
+def prepare(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.executemany(
+        'INSERT INTO post (id, text, comments_count) VALUES (?, ?, 0)',
+        ((pk, f'Пост {pk}') for pk in range(1, POSTS + 1))
+    )
+    connection.commit()
+    connection.close()
+
+
+def run(path, pragmas, readers, writers, seconds):
+    """Операции в секунду и число ошибок «database is locked»."""
+    prepare(path)
+    totals = {'read': 0, 'write': 0, 'locked': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(readers + writers)
+
+    def work(name, operation):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection.cursor(), pragmas)
+        rng = random.Random()
+        done = locked = 0
+        start.wait()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                operation(connection, rng.randint(1, POSTS))
+                done += 1
+            except sqlite3.OperationalError:
+                locked += 1
+        connection.close()
+        with lock:
+            totals[name] += done
+            totals['locked'] += locked
+
+    threads = [
+        threading.Thread(target=work, args=('read', read))
+        for _ in range(readers)
+    ] + [
+        threading.Thread(target=work, args=('write', write))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'read': totals['read'] / seconds,
+        'write': totals['write'] / seconds,
+        'locked': totals['locked'],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite с настройками '
+        'по умолчанию и с SQLITE_PRAGMAS при параллельных чтении и записи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        modes = (('по умолчанию', {}), ('SQLITE_PRAGMAS', SQLITE_PRAGMAS))
+        for title, pragmas in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                result = run(
+                    os.path.join(directory, 'benchmark.sqlite3'), pragmas,
+                    options['readers'], options['writers'], options['seconds']
+                )
+            self.stdout.write(
+                f'{title}: чтений/с {result["read"]:.0f}, '
+                f'записей/с {result["write"]:.0f}, '
+                f'ошибок блокировки {result["locked"]}'
+            )
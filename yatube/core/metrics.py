@@ -0,0 +1,129 @@
+"""Стоимость запросов по представлениям.
+
+Для текущего запроса считаются SQL-запросы и их время, время рендеринга
+шаблонов и исходы обращений к кэшу страниц; итоги копятся по имени
+представления (posts:index, posts:post_detail, …) в памяти процесса.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_totals = {}
+
+# Исход обращения к кэшу страниц -> счётчик
+CACHE_OUTCOMES = {
+    'hit': 'cache_hits', 'miss': 'cache_misses', 'stale': 'cache_stale'
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_stale = 0
+        self.paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper()."""
+        if self.paused:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} SQL"',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'cache;desc="hit {self.cache_hits}, miss {self.cache_misses}, '
+            f'stale {self.cache_stale}"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def untracked():
+    """Запросы фоновой работы, которую выполнили прямо в запросе."""
+    metrics = _current.get()
+    if metrics is None or metrics.paused:
+        yield
+        return
+    metrics.paused = True
+    try:
+        yield
+    finally:
+        metrics.paused = False
+
+
+def record_cache(outcome):
+    """outcome — 'hit', 'miss' или 'stale' (отдана устаревшая копия)."""
+    metrics = _current.get()
+    if metrics is not None:
+        counter = CACHE_OUTCOMES[outcome]
+        setattr(metrics, counter, getattr(metrics, counter) + 1)
+
+
+def record_render(duration):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.render_time += duration
+
+
+def collect(view_name, metrics, total):
+    with _lock:
+        stats = _totals.setdefault(view_name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_ms': 0.0,
+            'render_ms': 0.0, 'total_ms': 0.0, 'max_total_ms': 0.0,
+            'cache_hits': 0, 'cache_misses': 0, 'cache_stale': 0,
+        })
+        stats['requests'] += 1
+        stats['queries'] += metrics.queries
+        stats['max_queries'] = max(stats['max_queries'], metrics.queries)
+        stats['sql_ms'] += metrics.sql_time * 1000
+        stats['render_ms'] += metrics.render_time * 1000
+        stats['total_ms'] += total * 1000
+        stats['max_total_ms'] = max(stats['max_total_ms'], total * 1000)
+        stats['cache_hits'] += metrics.cache_hits
+        stats['cache_misses'] += metrics.cache_misses
+        stats['cache_stale'] += metrics.cache_stale
+
+
+def snapshot():
+    """Итоги по представлениям: суммы, средние на запрос и максимумы."""
+    with _lock:
+        totals = {name: dict(stats) for name, stats in _totals.items()}
+    for stats in totals.values():
+        for name in ('queries', 'sql_ms', 'render_ms', 'total_ms'):
+            stats[f'avg_{name}'] = round(stats[name] / stats['requests'], 2)
+    return totals
+
+
+def reset():
+    with _lock:
+        _totals.clear()
@@ -0,0 +1,84 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from yatube.settings import (
+    QUERY_BUDGETS, QUERY_BUDGETS_STRICT, REPLICA_LAG, REPLICA_STICKY_COOKIE
+)
+from . import metrics
+from .routers import one_replica, primary
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaStickinessMiddleware:
+    """Направляет в основную базу запросы, которые пишут, и запросы
+    пользователя, который только что писал.
+
+    После записи браузер получает cookie на REPLICA_LAG секунд; пока
+    она есть, чтение тоже идёт из основной базы. Остальные запросы
+    читают с одной реплики, выбранной на весь запрос.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        if writes or REPLICA_STICKY_COOKIE in request.COOKIES:
+            with primary():
+                response = self.get_response(request)
+        else:
+            with one_replica():
+                response = self.get_response(request)
+        if writes or getattr(request, 'used_primary', False):
+            response.set_cookie(
+                REPLICA_STICKY_COOKIE, '1', max_age=REPLICA_LAG,
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """Считает стоимость запроса и складывает её в core.metrics.
+
+    Итоги уходят в заголовок Server-Timing. Если представление сделало
+    больше SQL-запросов, чем разрешено в QUERY_BUDGETS, в строгом режиме
+    запрос падает с QueryBudgetExceeded, иначе пишется предупреждение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(request_metrics)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+        total = time.perf_counter() - start
+        response['Server-Timing'] = request_metrics.server_timing(total)
+        if request.resolver_match is None:
+            return response
+        view_name = request.resolver_match.view_name
+        metrics.collect(view_name, request_metrics, total)
+        budget = QUERY_BUDGETS.get(view_name)
+        if budget is not None and request_metrics.queries > budget:
+            message = (
+                f'{view_name}: {request_metrics.queries} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if QUERY_BUDGETS_STRICT:
+                raise metrics.QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,76 @@
+"""Чтение с реплик, запись — в основную базу.
+
+Запросы, которые пишут, и запросы пользователя в течение REPLICA_LAG
+секунд после записи идут в основную базу: так он сразу видит свои
+изменения, даже если реплика ещё отстаёт. Остальные запросы читают
+с одной реплики на весь запрос: реплики отстают по-разному, и страница,
+собранная с нескольких, могла бы не сойтись сама с собой.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from yatube.settings import DATABASE_REPLICAS
+
+PRIMARY = 'default'
+
+_use_primary = ContextVar('use_primary', default=False)
+_replica = ContextVar('replica', default=None)
+
+
+class ReplicaRouter:
+    replicas = DATABASE_REPLICAS
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or _use_primary.get():
+            return PRIMARY
+        # Вне запроса (команды, фоновые потоки) реплика не закреплена
+        return _replica.get() or random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def using_replica():
+    """Читает ли текущий запрос с реплики."""
+    return bool(ReplicaRouter.replicas) and not _use_primary.get()
+
+
+def pinned_to_primary():
+    """Пишет ли текущий запрос или его пользователь только что писал."""
+    return _use_primary.get()
+
+
+@contextmanager
+def primary():
+    """Все запросы внутри блока идут в основную базу."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+@contextmanager
+def one_replica():
+    """Все чтения внутри блока идут с одной случайной реплики."""
+    replicas = ReplicaRouter.replicas
+    token = _replica.set(random.choice(replicas) if replicas else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def use_primary(view):
+    """Представление, которое пишет: читает и пишет только в основную базу."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.used_primary = True
+        with primary():
+            return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,16 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from yatube.settings import SQLITE_PRAGMAS, SQLITE_TUNING
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if SQLITE_TUNING and connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, SQLITE_PRAGMAS)
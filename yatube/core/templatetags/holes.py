@@ -0,0 +1,51 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.holes import is_shell, placeholder, render_hole
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **args):
+    """Персональный фрагмент: шаблон template_name с аргументами args.
+
+    В общей оболочке страницы вместо него остаётся метка.
+    """
+    request = context.get('request')
+    if is_shell(request):
+        return mark_safe(placeholder(template_name, args))
+    return mark_safe(render_hole(template_name, args, request))
+
+
+class MembersOnlyNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        if is_shell(context.get('request')):
+            return (
+                f'<!--members-->{self.nodelist.render(context)}'
+                '<!--/members-->'
+            )
+        user = context.get('user')
+        if user is not None and user.is_authenticated:
+            return self.nodelist.render(context)
+        return ''
+
+
+@register.tag
+def members_only(parser, token):
+    """Общая для всех часть страницы, которую видят только пользователи."""
+    nodelist = parser.parse(('endmembers_only',))
+    parser.delete_first_token()
+    return MembersOnlyNode(nodelist)
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    user = context.get('user')
+    return bool(user and user.is_authenticated) and Follow.objects.filter(
+        user=user, author_id=author_id
+    ).exists()
@@ -0,0 +1,10 @@
+from django import template
+
+from yatube.utils import elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj):
+    return list(elided_page_range(page_obj))
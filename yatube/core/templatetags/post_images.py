@@ -0,0 +1,39 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from posts.thumbnails import FORMATS, MIME_TYPES, get_thumbnails
+
+register = template.Library()
+
+
+def srcset(variants):
+    return ', '.join(f'{url} {width}w' for url, width in variants)
+
+
+@register.simple_tag
+def post_image(image, size, css_class='', lazy=True):
+    """<picture> с готовыми вариантами миниатюры в srcset.
+
+    Пока миниатюры нет, выводится заглушка того же размера.
+    """
+    if not image:
+        return ''
+    thumbnail, ready = get_thumbnails(image, size)
+    sizes = f'(max-width: {thumbnail.width}px) 100vw, {thumbnail.width}px'
+    fallback = ready.pop(FORMATS[-1], None)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES[format_], srcset(variants), sizes)
+            for format_, variants in ready.items()
+        )
+    )
+    responsive = format_html(
+        ' srcset="{}" sizes="{}"', srcset(fallback), sizes
+    ) if fallback else ''
+    return format_html(
+        '<picture>{}<img class="{}" src="{}"{} width="{}" height="{}" '
+        'alt="" loading="{}" decoding="async"></picture>',
+        sources, css_class, thumbnail.url, responsive,
+        thumbnail.width, thumbnail.height, 'lazy' if lazy else 'eager'
+    )
@@ -1,4 +1,66 @@
-from django.test import TestCase
+import shutil
+import socketserver
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+
+from core import metrics
+from core.middleware import ReplicaStickinessMiddleware
+from core.routers import ReplicaRouter, one_replica, primary, using_replica
+from posts.cache import (
+    evict, get_versions, page_timeout, version_key, versioned_cache_page
+)
+from posts.feed import backfill
+from posts.models import Comment, Follow, Group, Post
+from posts.search import search_posts
+from posts.thumbnails import thumbnails_ready
+from posts.thumbnails import generate
+from yatube.settings import (
+    QUERY_BUDGETS, REPLICA_LAG, REPLICA_STICKY_COOKIE
+)
+
+try:
+    import memcache
+except ImportError:
+    memcache = None
+
+User = get_user_model()
+
+CACHE_DIR = tempfile.mkdtemp()
+MEDIA_DIR = tempfile.mkdtemp()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+FILE_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'KEY_PREFIX': 'yatube',
+        'VERSION': 1,
+    }
+}
 
 
 class CoreTestClass(TestCase):
@@ -6,3 +68,512 @@ class CoreTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(CACHES=FILE_CACHES)
+class SharedCacheTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def other_worker_cache(self):
+        return FileBasedCache(CACHE_DIR, {'KEY_PREFIX': 'yatube'})
+
+    def test_pages_and_evictions_are_shared_between_workers(self):
+        self.client.get(reverse('posts:index'))
+        other = self.other_worker_cache()
+        version = other.get(version_key('index'))
+        self.assertIsNotNone(version)
+        evict('index')
+        self.assertEqual(other.get(version_key('index')), version + 1)
+
+    def test_cache_stats(self):
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn("FileBasedCache, префикс 'yatube'", out.getvalue())
+        self.assertIn('entries: ', out.getvalue())
+
+
+class MemcachedStandIn(socketserver.ThreadingTCPServer):
+    """Сервер с текстовым протоколом memcached, данные — в памяти.
+
+    Команды выполняются под одной блокировкой, как на настоящем
+    сервере: get, set, add, incr, decr, delete, touch, flush_all, stats.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MemcachedHandler)
+        self.items = {}
+        self.lock = threading.Lock()
+
+    @property
+    def location(self):
+        return '%s:%s' % self.server_address
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    STORAGE = (b'set', b'add')
+
+    def handle(self):
+        for line in iter(self.rfile.readline, b''):
+            command, *args = line.split()
+            noreply = args[-1:] == [b'noreply']
+            if noreply:
+                args.pop()
+            data = None
+            if command in self.STORAGE:
+                data = self.rfile.read(int(args[3]) + 2)[:-2]
+            handler = getattr(self, f'do_{command.decode()}', None)
+            with self.server.lock:
+                reply = b'ERROR' if handler is None else handler(args, data)
+            if not noreply:
+                self.wfile.write(reply + b'\r\n')
+
+    @staticmethod
+    def expires(exptime):
+        exptime = int(exptime)
+        if exptime == 0:
+            return None
+        if exptime < 0:
+            return 0
+        # Больше 30 дней — это уже момент времени, а не срок
+        return exptime if exptime > 30 * 24 * 3600 else time.time() + exptime
+
+    def live(self, key):
+        item = self.server.items.get(key)
+        if item is not None and item[2] is not None and item[2] <= time.time():
+            del self.server.items[key]
+            return None
+        return item
+
+    def do_get(self, keys, data):
+        lines = []
+        for key in keys:
+            item = self.live(key)
+            if item is not None:
+                flags, value, _ = item
+                lines.append(b'VALUE %s %s %d\r\n%s' % (
+                    key, flags, len(value), value
+                ))
+        return b'\r\n'.join(lines + [b'END'])
+
+    def do_set(self, args, data):
+        key, flags, exptime = args[:3]
+        self.server.items[key] = (flags, data, self.expires(exptime))
+        return b'STORED'
+
+    def do_add(self, args, data):
+        if self.live(args[0]) is not None:
+            return b'NOT_STORED'
+        return self.do_set(args, data)
+
+    def do_incr(self, args, data, sign=1):
+        key, delta = args
+        item = self.live(key)
+        if item is None:
+            return b'NOT_FOUND'
+        flags, value, expires = item
+        value = b'%d' % max(int(value) + sign * int(delta), 0)
+        self.server.items[key] = (flags, value, expires)
+        return value
+
+    def do_decr(self, args, data):
+        return self.do_incr(args, data, sign=-1)
+
+    def do_delete(self, args, data):
+        if self.live(args[0]) is None:
+            return b'NOT_FOUND'
+        del self.server.items[args[0]]
+        return b'DELETED'
+
+    def do_touch(self, args, data):
+        key, exptime = args
+        item = self.live(key)
+        if item is None:
+            return b'NOT_FOUND'
+        self.server.items[key] = item[:2] + (self.expires(exptime),)
+        return b'TOUCHED'
+
+    def do_flush_all(self, args, data):
+        self.server.items.clear()
+        return b'OK'
+
+    def do_stats(self, args, data):
+        size = sum(len(value) for _, value, _ in self.server.items.values())
+        return (
+            b'STAT curr_items %d\r\nSTAT bytes %d\r\nEND'
+            % (len(self.server.items), size)
+        )
+
+
+@skipUnless(memcache, 'нужен python-memcached из requirements.txt')
+class SharedCacheContractTests(SimpleTestCase):
+    """Контракт общего кэша: add и incr атомарны для всех воркеров.
+
+    На нём держатся блокировка перегенерации страницы и версии
+    областей (posts.cache). Проверяется на заглушке сервера memcached;
+    file и locmem контракту не отвечают (см. CACHE_BACKENDS в settings).
+    """
+
+    workers = 8
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MemcachedStandIn()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.memcached = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.memcached.'
+                           'MemcachedCache',
+                'LOCATION': cls.server.location,
+                'KEY_PREFIX': 'yatube',
+            }
+        })
+        cls.memcached.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.memcached.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def run_workers(self, work):
+        """Запускает work во всех воркерах разом.
+
+        У каждого потока своё соединение с кэшем, как у отдельного
+        процесса.
+        """
+        start = threading.Barrier(self.workers)
+
+        def worker(number):
+            start.wait()
+            try:
+                return work()
+            finally:
+                caches['default'].close()
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(worker, range(self.workers)))
+
+    def test_version_bumps_from_all_workers_add_up(self):
+        version = int(get_versions(['index'])[0])
+
+        def bump():
+            for attempt in range(25):
+                evict('index')
+
+        self.run_workers(bump)
+        self.assertEqual(
+            int(get_versions(['index'])[0]), version + self.workers * 25
+        )
+
+    def test_one_worker_regenerates_outdated_page(self):
+        renders = []
+
+        @versioned_cache_page('contract')
+        def page(request):
+            renders.append(request)
+            time.sleep(0.2)
+            return HttpResponse(f'Страница {len(renders)}')
+
+        factory = RequestFactory()
+
+        def get():
+            return page(factory.get('/contract/')).content.decode()
+
+        get()
+        evict('contract')
+        pages = self.run_workers(get)
+        self.assertEqual(len(renders), 2)
+        self.assertEqual(pages.count('Страница 2'), 1)
+        self.assertEqual(pages.count('Страница 1'), self.workers - 1)
+
+    def test_cache_stats(self):
+        evict('index')
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn("MemcachedCache, префикс 'yatube'", out.getvalue())
+        self.assertIn('curr_items: ', out.getvalue())
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'lagging_replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def replicate(self, *objects):
+        """Реплика догнала основную базу по этим строкам."""
+        for obj in objects:
+            obj.save_base(raw=True, using='lagging_replica')
+
+    def run_middleware(self, request):
+        reads = []
+
+        def get_response(request):
+            reads.append(using_replica())
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(get_response)(request)
+        return reads[0], response
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self):
+        replicas = ['replica_1', 'replica_2']
+        with mock.patch.object(ReplicaRouter, 'replicas', replicas):
+            self.assertIn(self.router.db_for_read(Post), replicas)
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            with primary():
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_without_replicas_reads_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(using_replica())
+
+    def test_request_reads_from_one_replica(self):
+        replicas = [f'replica_{number}' for number in range(10)]
+        with mock.patch.object(ReplicaRouter, 'replicas', replicas):
+            for attempt in range(5):
+                with one_replica():
+                    chosen = {
+                        self.router.db_for_read(Post) for query in range(20)
+                    }
+                self.assertEqual(len(chosen), 1)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_writer_reads_own_writes(self):
+        on_replica, response = self.run_middleware(self.factory.post('/'))
+        self.assertFalse(on_replica)
+        self.assertEqual(
+            response.cookies[REPLICA_STICKY_COOKIE]['max-age'], REPLICA_LAG
+        )
+        request = self.factory.get('/')
+        request.COOKIES[REPLICA_STICKY_COOKIE] = '1'
+        self.assertFalse(self.run_middleware(request)[0])
+        on_replica, response = self.run_middleware(self.factory.get('/'))
+        self.assertTrue(on_replica)
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_write_views_use_primary(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        self.client.force_login(reader)
+        session = Session.objects.using('default').get(
+            pk=self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        )
+        self.replicate(author, reader, session)
+        response = self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertTrue(Follow.objects.using('default').exists())
+        self.assertFalse(Follow.objects.using('lagging_replica').exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_sticky_cookie_hides_replica_lag(self):
+        # Реплика ещё не получила ни пользователя, ни его пост
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Свежий пост')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        self.client.force_login(author)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Свежий комментарий'}
+        )
+        self.assertIn(REPLICA_STICKY_COOKIE, self.client.cookies)
+        cache.clear()
+        response = self.client.get(url)
+        self.assertContains(response, 'Свежий комментарий')
+        del self.client.cookies[REPLICA_STICKY_COOKIE]
+        cache.clear()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_ready_thumbnails_evict_pages_before_replica_catches_up(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост с картинкой')
+        version = get_versions([f'post:{post.pk}'])[0]
+        # Сигнал приходит из потока пула, вне запроса
+        thumbnails_ready.send(sender=Post, post_id=post.pk)
+        self.assertNotEqual(get_versions([f'post:{post.pk}'])[0], version)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_search_reads_from_replica(self):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Кот на реплике')
+        self.assertEqual(search_posts('кот').count(), 0)
+        with primary():
+            self.assertEqual(search_posts('кот').count(), 1)
+
+    @mock.patch.object(ReplicaRouter, 'replicas', ['lagging_replica'])
+    def test_fresh_pages_from_replica_are_cached_briefly(self):
+        self.assertEqual(page_timeout(['index'], 3600), 3600)
+        evict('index')
+        self.assertEqual(page_timeout(['index'], 3600), REPLICA_LAG)
+        with primary():
+            self.assertEqual(page_timeout(['index'], 3600), 3600)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        default = connections['default']
+        fresh = default.__class__(default.settings_dict, 'tuning')
+        self.addCleanup(fresh.close)
+        with mock.patch('core.signals.SQLITE_TUNING', True):
+            with fresh.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 5000)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_benchmark_compares_modes(self):
+        out = StringIO()
+        call_command(
+            'sqlite_benchmark', '--readers=2', '--writers=1',
+            '--seconds=0.2', stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('SQLITE_PRAGMAS: чтений/с'))
+
+
+def gif(name='cat.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_DIR)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Кот {number}',
+                image=gif()
+            )
+            if number % 2:
+                generate(cls.post.pk, cls.post.image.name)
+            cls.comment = None
+            for author in (cls.author, cls.reader, cls.author):
+                cls.comment = Comment.objects.create(
+                    post=cls.post, author=author, parent=cls.comment,
+                    text='Комментарий'
+                )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        backfill(cls.reader, cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.reader_client = self.client_class()
+        self.reader_client.force_login(self.reader)
+        self.author_client = self.client_class()
+        self.author_client.force_login(self.author)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ SQL"')
+        self.assertIn('cache;desc="hit 0, miss 1, stale 0"', timing)
+        self.assertRegex(timing, r'render;dur=[\d.]+')
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn(
+            'cache;desc="hit 1, miss 0, stale 0"', response['Server-Timing']
+        )
+
+    def test_metrics_endpoint_is_for_staff(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.reader_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 302)
+        User.objects.filter(pk=self.reader.pk).update(is_staff=True)
+        stats = self.reader_client.get(reverse('metrics')).json()
+        self.assertEqual(stats['posts:index']['requests'], 2)
+        self.assertEqual(stats['posts:index']['cache_hits'], 1)
+        self.assertIn('avg_total_ms', stats['posts:index'])
+
+    @mock.patch('core.middleware.QUERY_BUDGETS_STRICT', True)
+    def test_views_stay_within_budgets(self):
+        post_id = self.post.pk
+        pages = (
+            ('posts:index', {}),
+            ('posts:group_list', {'slug': self.group.slug}),
+            ('posts:profile', {'username': self.author.username}),
+            ('posts:post_detail', {'post_id': post_id}),
+            ('posts:comments', {'post_id': post_id}),
+            ('posts:search', {}),
+        )
+        for client in (self.client, self.reader_client):
+            for name, kwargs in pages:
+                with self.subTest(name=name, client=client):
+                    cache.clear()
+                    client.get(reverse(name, kwargs=kwargs), {'q': 'кот'})
+        self.reader_client.get(reverse('posts:follow_index'))
+        comment = reverse('posts:add_comment', kwargs={'post_id': post_id})
+        self.reader_client.post(comment, {'text': 'Ещё комментарий'})
+        self.reader_client.post(
+            comment, {'text': 'Ответ', 'parent': self.comment.pk}
+        )
+        self.author_client.get(reverse('posts:create_post'))
+        self.author_client.post(
+            reverse('posts:create_post'),
+            {'text': 'Новый пост', 'group': self.group.pk, 'image': gif()}
+        )
+        edit = reverse('posts:post_edit', kwargs={'post_id': post_id})
+        self.author_client.get(edit)
+        self.author_client.post(
+            edit, {'text': 'Правка', 'image': gif('dog.gif')}
+        )
+        self.assertTrue(Comment.objects.filter(
+            text='Ответ', parent__isnull=False
+        ).exists())
+        self.assertTrue(Post.objects.get(text='Новый пост').image)
+        self.assertEqual(set(metrics.snapshot()), set(QUERY_BUDGETS))
+
+    @mock.patch('core.middleware.QUERY_BUDGETS_STRICT', True)
+    def test_pages_past_the_end_stay_within_budgets(self):
+        pages = [
+            (client, name, kwargs)
+            for client in (self.client, self.reader_client)
+            for name, kwargs in (
+                ('posts:index', {}),
+                ('posts:group_list', {'slug': self.group.slug}),
+                ('posts:profile', {'username': self.author}),
+                ('posts:search', {}),
+            )
+        ]
+        pages.append((self.reader_client, 'posts:follow_index', {}))
+        for client, name, kwargs in pages:
+            with self.subTest(name=name, client=client):
+                cache.clear()
+                response = client.get(
+                    reverse(name, kwargs=kwargs), {'q': 'кот', 'page': 99}
+                )
+                self.assertEqual(response.context['page_obj'].number, 2)
+
+    @mock.patch('core.middleware.QUERY_BUDGETS_STRICT', True)
+    @mock.patch.dict(QUERY_BUDGETS, {'posts:index': 1})
+    def test_budget_violation_fails(self):
+        with self.assertRaises(metrics.QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
@@ -0,0 +1,189 @@
+import hashlib
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from core.holes import fill
+from core.metrics import record_cache
+from core.routers import pinned_to_primary, using_replica
+from yatube.settings import (
+    PAGE_CACHE_JITTER, PAGE_CACHE_LOCK_TIMEOUT, PAGE_CACHE_STALE,
+    PAGE_CACHE_TIMEOUT, REPLICA_LAG
+)
+
+
+def version_key(scope):
+    return f'page_version:{scope}'
+
+
+def changed_key(scope):
+    return f'page_changed:{scope}'
+
+
+def modified_key(scope):
+    return f'page_modified:{scope}'
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def get_or_init(keys):
+    """Значения ключей; отсутствующие заполняются текущим временем."""
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, now_ms(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def get_versions(scopes):
+    return [str(version) for version in get_or_init(
+        [version_key(scope) for scope in scopes]
+    )]
+
+
+def get_modified(scopes):
+    """Время последнего изменения областей, мс.
+
+    Если оно неизвестно (кэш очищен), изменением считается текущий момент.
+    """
+    return get_or_init([modified_key(scope) for scope in scopes])
+
+
+def viewer_key(request):
+    user = request.user
+    return str(user.pk) if user.is_authenticated else 'anon'
+
+
+def evict(*scopes):
+    """Сбрасывает закэшированные страницы, зависящие от scopes.
+
+    Сами страницы не удаляются: у области меняется версия, и старые
+    ключи перестают совпадать, пока не истекут.
+    """
+    cache.set_many(
+        {changed_key(scope): True for scope in scopes}, REPLICA_LAG
+    )
+    cache.set_many({modified_key(scope): now_ms() for scope in scopes}, None)
+    for scope in set(scopes):
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            cache.add(version_key(scope), int(time.time() * 1000), None)
+
+
+def page_timeout(scopes, timeout):
+    if using_replica() and cache.get_many(
+        [changed_key(scope) for scope in scopes]
+    ):
+        return REPLICA_LAG
+    return timeout
+
+
+def versioned_cache_page(*scopes, timeout=PAGE_CACHE_TIMEOUT):
+    """Кэширует GET-ответ представления с версионированным ключом.
+
+    scopes — шаблоны областей вида 'group:{slug}', подставляются из
+    аргументов URL. В кэше лежит одна оболочка страницы на всех:
+    персональные фрагменты (core.holes) заполняются для каждого запроса
+    заново, без запроса ленты. Страница, прочитанная с реплики
+    вскоре после изменения, может быть устаревшей и хранится только
+    REPLICA_LAG секунд.
+
+    Истёкшую или сброшенную страницу заново готовит только тот, кто
+    взял блокировку в кэше; остальным, пока она держится, отдаётся
+    прежняя копия. Исключение — пользователь, который только что писал:
+    он своих изменений ждёт.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_scopes = [scope.format(**kwargs) for scope in scopes]
+            versions = '.'.join(get_versions(page_scopes))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'page:{view.__name__}:{path}'
+            entry = cache.get(key)
+            if entry is not None:
+                entry_versions, fresh_until, response = entry
+                if entry_versions == versions and time.time() < fresh_until:
+                    record_cache('hit')
+                    return fill(response, request)
+            lock = f'{key}:lock'
+            locked = cache.add(lock, True, PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked and entry is not None and not pinned_to_primary():
+                record_cache('stale')
+                response.is_stale = True
+                return fill(response, request)
+            record_cache('miss')
+            request.page_shell = True
+            try:
+                response = view(request, *args, **kwargs)
+                patch_vary_headers(response, ('Cookie',))
+                if response.status_code == 200 and not response.cookies:
+                    fresh = page_timeout(page_scopes, timeout) * (
+                        1 - random.uniform(0, PAGE_CACHE_JITTER)
+                    )
+                    cache.set(
+                        key, (versions, time.time() + fresh, response),
+                        fresh + PAGE_CACHE_STALE
+                    )
+            finally:
+                request.page_shell = False
+                if locked:
+                    cache.delete(lock)
+            return fill(response, request)
+        return wrapper
+    return decorator
+
+
+def conditional_page(*scopes):
+    """Отдаёт 304 Not Modified, если страница не менялась.
+
+    ETag страницы — хэш версий её областей, зрителя и адреса,
+    Last-Modified — время последнего изменения областей. Всё это лежит
+    в кэше, поэтому неизменившаяся страница отдаётся без запроса ленты
+    и рендеринга шаблона. Браузер обязан перепроверять страницу
+    (no-cache), а личные страницы не хранятся в общих кэшах (private).
+    """
+    def page_scopes(kwargs):
+        return [scope.format(**kwargs) for scope in scopes]
+
+    def etag(request, *args, **kwargs):
+        parts = get_versions(page_scopes(kwargs)) + [
+            viewer_key(request), request.get_full_path()
+        ]
+        digest = hashlib.md5(':'.join(parts).encode()).hexdigest()
+        # Слабый: токен CSRF в формах меняется от рендеринга к рендерингу
+        return f'W/"{digest}"'
+
+    def last_modified(request, *args, **kwargs):
+        modified = max(get_modified(page_scopes(kwargs)))
+        return datetime.fromtimestamp(modified / 1000, timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if getattr(response, 'is_stale', False):
+                # Устаревшую копию нельзя пометить валидаторами свежей
+                del response['ETag']
+                del response['Last-Modified']
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(
+                response, no_cache=True,
+                private=request.user.is_authenticated
+            )
+            return response
+        return wrapper
+    return decorator
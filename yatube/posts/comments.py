@@ -0,0 +1,62 @@
+"""Комментарии к посту по страницам.
+
+Комментарии образуют дерево ответов и идут в его порядке: за каждым
+комментарием — его ответы, ветки от старых к новым. Порядок задаёт путь
+(Comment.path), поэтому страница — один запрос по индексу (post, path),
+а следующая выбирается по пути последнего показанного комментария и
+не зависит от того, сколько комментариев у поста.
+"""
+import re
+
+from django.db.models.functions import Length
+from django.shortcuts import get_object_or_404
+
+from yatube.settings import COMMENTS_MAX_DEPTH, COMMENTS_PER_PAGE
+from .models import PATH_STEP, Comment
+
+CURSOR = re.compile(r'[0-9a-z]+')
+# Пути состоят из [0-9a-z], поэтому все потомки лежат между путём
+# комментария и тем же путём с символом, следующим за 'z'
+AFTER_SUBTREE = '{'
+
+
+def comment_page(post_id, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """Страница комментариев и курсор следующей (или None)."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).order_by('path')
+    if cursor and CURSOR.fullmatch(cursor):
+        comments = comments.filter(path__gt=cursor)
+    rows = list(comments[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, rows[-1].path
+
+
+def reply_parent(post, parent_id):
+    """Комментарий поста, к которому встанет ответ на parent_id.
+
+    Глубже COMMENTS_MAX_DEPTH ветка не растёт: ответ на самый глубокий
+    комментарий встаёт рядом с ним.
+    """
+    parent = get_object_or_404(
+        post.comments.select_related('parent'), pk=parent_id
+    )
+    if parent.depth >= COMMENTS_MAX_DEPTH - 1:
+        return parent.parent
+    return parent
+
+
+def subtree(comment, depth=None):
+    """Ответы на comment в порядке дерева, не глубже depth уровней."""
+    replies = Comment.objects.filter(
+        post_id=comment.post_id,
+        path__gt=comment.path,
+        path__lt=comment.path + AFTER_SUBTREE,
+    )
+    if depth is not None:
+        replies = replies.annotate(path_length=Length('path')).filter(
+            path_length__lte=len(comment.path) + depth * PATH_STEP
+        )
+    return replies.select_related('author').order_by('path')
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.db import connection, router, transaction
+from django.db.models import F, FilteredRelation, Q
+from django.dispatch import Signal
+
+from users.models import Profile
+from yatube.utils import KeysetPaginator
+from .models import FeedEntry, Follow, Post, User
+
+# Ключ страниц ленты из записей FeedEntry (см. follow_feed)
+ENTRY_KEY = ('feed_date', 'feed_post')
+
+# Отписка (см. unfollow) удаляет подписку без post_delete; получатели
+# обновляют счётчики и кэш по id автора и именам, которые уже известны
+unfollowed = Signal(providing_args=['user', 'author_id', 'username'])
+
+
+def is_fanout_author(author_id):
+    return not Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not settings.FEED_FANOUT or not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id, post=post, author_id=post.author_id,
+                pub_date=post.pub_date
+            )
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def insert_entries(select, params):
+    """Вставляет в ленты строки select, пропуская уже разложенные посты.
+
+    select выбирает (user_id, post_id, author_id, pub_date).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+            f'{FeedEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) {select} '
+            + connection.ops.ignore_conflicts_suffix_sql(
+                ignore_conflicts=True
+            ),
+            params
+        )
+        return cursor.rowcount
+
+
+def backfill(user, author):
+    """Добавляет в ленту читателя уже опубликованные посты автора.
+
+    Один INSERT ... SELECT; у автора больше FEED_FANOUT_THRESHOLD
+    подписчиков ничего не вставляется.
+    """
+    if not settings.FEED_FANOUT:
+        return 0
+    posts, profiles = (model._meta.db_table for model in (Post, Profile))
+    return insert_entries(
+        f'SELECT %s, p.id, p.author_id, p.pub_date FROM {posts} p '
+        'WHERE p.author_id = %s AND NOT EXISTS ('
+        f'SELECT 1 FROM {profiles} pr '
+        'WHERE pr.user_id = %s AND pr.followers_count > %s)',
+        [user.pk, author.pk, author.pk, settings.FEED_FANOUT_THRESHOLD]
+    )
+
+
+def refill_author(author_id):
+    """Раскладывает все посты автора по лентам его подписчиков.
+
+    Пока у автора больше FEED_FANOUT_THRESHOLD подписчиков, его новые
+    посты в ленты не попадают, а подмешиваются при чтении. Когда
+    подписчиков становится ровно FEED_FANOUT_THRESHOLD, подмешивать
+    их перестают, поэтому пропущенные посты раскладываются здесь;
+    в остальных случаях запрос ничего не вставляет.
+    """
+    if not settings.FEED_FANOUT:
+        return 0
+    follows, posts, profiles = (
+        model._meta.db_table for model in (Follow, Post, Profile)
+    )
+    return insert_entries(
+        f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {follows} f '
+        f'JOIN {posts} p ON p.author_id = f.author_id '
+        f'JOIN {profiles} pr ON pr.user_id = f.author_id '
+        'WHERE f.author_id = %s AND pr.followers_count = %s',
+        [author_id, settings.FEED_FANOUT_THRESHOLD]
+    )
+
+
+def prune(user, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    FeedEntry.objects.filter(user=user, author_id=author_id).delete()
+
+
+@transaction.atomic
+def unfollow(user, username):
+    """Отписывает читателя от автора; False, если подписки не было.
+
+    Подписка удаляется одним DELETE без выборки и post_delete,
+    вместо него отправляется unfollowed.
+    """
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return False
+    follows = Follow.objects.filter(user=user, author_id=author_id)
+    if not follows._raw_delete(router.db_for_write(Follow)):
+        return False
+    prune(user, author_id)
+    unfollowed.send(
+        sender=Follow, user=user, author_id=author_id, username=username
+    )
+    return True
+
+
+@transaction.atomic
+def rebuild_feeds():
+    """Заново раскладывает все посты по лентам подписчиков.
+
+    Нужна после массовой загрузки данных в обход сигналов.
+    """
+    FeedEntry.objects.all().delete()
+    if not settings.FEED_FANOUT:
+        return 0
+    entries, follows, posts, profiles = (
+        model._meta.db_table for model in (FeedEntry, Follow, Post, Profile)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {follows} f '
+            f'JOIN {posts} p ON p.author_id = f.author_id '
+            f'JOIN {profiles} pr ON pr.user_id = f.author_id '
+            'WHERE pr.followers_count <= %s',
+            [settings.FEED_FANOUT_THRESHOLD]
+        )
+        return cursor.rowcount
+
+
+def follow_feed(user):
+    """Посты авторов, на которых подписан пользователь, и ключ их страниц.
+
+    Если вся лента разложена по FeedEntry, дата и id поста для ключа
+    берутся из записей ленты: страница — это отрезок индекса
+    (user, -pub_date, -post), без сортировки всей ленты.
+    """
+    posts = Post.objects.for_feed(comments=True)
+    if not settings.FEED_FANOUT:
+        return (
+            posts.filter(author__following__user=user), KeysetPaginator.key
+        )
+    big_authors = Follow.objects.filter(
+        user=user,
+        author__profile__followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+    ).values('author_id')
+    if big_authors.exists():
+        entries = FeedEntry.objects.filter(user=user).values('post_id')
+        return (
+            posts.filter(Q(pk__in=entries) | Q(author__in=big_authors)),
+            KeysetPaginator.key
+        )
+    # Одно соединение с записями ленты читателя: фильтры курсора по
+    # аннотациям не добавляют новых соединений
+    return posts.annotate(
+        entry=FilteredRelation(
+            'feed_entries', condition=Q(feed_entries__user=user)
+        ),
+        feed_date=F('entry__pub_date'),
+        feed_post=F('entry__post_id'),
+    ).filter(feed_date__isnull=False), ENTRY_KEY
@@ -0,0 +1,49 @@
+"""Приведение загруженных картинок к виду, в котором они хранятся."""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from yatube.settings import IMAGE_MAX_SIZE, IMAGE_QUALITY
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def normalize_image(file_, name):
+    """Возвращает файл картинки, её ширину, высоту и sha256 содержимого.
+
+    Картинка поворачивается по EXIF, уменьшается до IMAGE_MAX_SIZE и
+    сохраняется без метаданных: непрозрачная — прогрессивным JPEG,
+    прозрачная — PNG. GIF в пределах размера хранится как есть, чтобы
+    не потерять анимацию.
+    """
+    file_.seek(0)
+    image = Image.open(file_)
+    if image.format == 'GIF' and max(image.size) <= IMAGE_MAX_SIZE:
+        file_.seek(0)
+        data = file_.read()
+    else:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE), Image.LANCZOS)
+        buffer = BytesIO()
+        root = os.path.splitext(os.path.basename(name))[0]
+        if has_alpha(image):
+            image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+            name = f'{root}.png'
+        else:
+            image.convert('RGB').save(
+                buffer, 'JPEG', quality=IMAGE_QUALITY,
+                optimize=True, progressive=True
+            )
+            name = f'{root}.jpg'
+        data = buffer.getvalue()
+    return (
+        ContentFile(data, name=os.path.basename(name)),
+        image.width, image.height, hashlib.sha256(data).hexdigest()
+    )
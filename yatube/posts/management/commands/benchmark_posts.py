@@ -0,0 +1,256 @@
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post
+from yatube.settings import (
+    ALLOWED_HOSTS, BASE_DIR, BENCHMARK_DIR, BENCHMARK_MIX
+)
+
+User = get_user_model()
+
+QUERIES = re.compile(r'desc="(\d+) SQL"')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Значение, не меньше которого rank процентов выборки (nearest rank)."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def sample_pks(model, size, rng, **filters):
+    """Случайные существующие pk без ORDER BY RANDOM() по всей таблице."""
+    bounds = model.objects.filter(**filters).aggregate(
+        low=Min('pk'), high=Max('pk')
+    )
+    if bounds['low'] is None:
+        return []
+    candidates = {
+        rng.randint(bounds['low'], bounds['high']) for _ in range(size * 2)
+    }
+    return list(
+        model.objects.filter(pk__in=candidates, **filters)
+        .values_list('pk', flat=True).distinct()[:size]
+    )
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Traffic:
+    """Случайные запросы к представлениям в пропорциях BENCHMARK_MIX."""
+
+    def __init__(self, rng, readers, mix):
+        self.rng = rng
+        self.mix = mix
+        self.post_ids = sample_pks(Post, 1000, rng)
+        self.usernames = list(
+            User.objects.filter(
+                pk__in=sample_pks(User, 1000, rng, posts__isnull=False)
+            ).values_list('username', flat=True)
+        )
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        if not self.post_ids:
+            raise CommandError('В базе нет постов: запустите seed_posts')
+        self.anonymous = Client(HTTP_HOST=ALLOWED_HOSTS[0])
+        self.readers = []
+        follower_ids = sample_pks(
+            User, readers, rng, follower__isnull=False
+        ) or sample_pks(User, readers, rng)
+        for user in User.objects.filter(pk__in=follower_ids):
+            client = Client(HTTP_HOST=ALLOWED_HOSTS[0])
+            client.force_login(user)
+            self.readers.append(client)
+
+    def page(self):
+        if self.rng.random() < 0.2:
+            return {'page': self.rng.randint(2, 5)}
+        return {}
+
+    def client(self, share_of_readers=0.3):
+        if self.readers and self.rng.random() < share_of_readers:
+            return self.rng.choice(self.readers)
+        return self.anonymous
+
+    def index(self):
+        return self.client().get(reverse('posts:index'), self.page())
+
+    def group_posts(self):
+        if not self.slugs:
+            return self.index()
+        slug = self.rng.choice(self.slugs)
+        return self.client().get(
+            reverse('posts:group_list', args=(slug,)), self.page()
+        )
+
+    def profile(self):
+        username = self.rng.choice(self.usernames)
+        return self.client().get(
+            reverse('posts:profile', args=(username,)), self.page()
+        )
+
+    def post_detail(self):
+        post_id = self.rng.choice(self.post_ids)
+        return self.client().get(
+            reverse('posts:post_detail', args=(post_id,))
+        )
+
+    def follow_index(self):
+        return self.client(1).get(reverse('posts:follow_index'), self.page())
+
+    def add_comment(self):
+        post_id = self.rng.choice(self.post_ids)
+        return self.client(1).post(
+            reverse('posts:add_comment', args=(post_id,)),
+            {'text': 'Комментарий из нагрузочного теста'}
+        )
+
+    def choose(self):
+        views = list(self.mix)
+        return self.rng.choices(views, weights=[self.mix[v] for v in views])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Проигрывает смесь запросов к лентам, постам и комментариям и '
+        'сохраняет перцентили задержек, число SQL-запросов и RPS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=200)
+        parser.add_argument(
+            '--readers', type=int, default=100,
+            help='Сколько авторизованных пользователей участвует в смеси'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=BENCHMARK_DIR)
+        parser.add_argument(
+            '--compare', help='Файл прошлого прогона для сравнения'
+        )
+
+    def run(self, traffic, count):
+        samples = {view: [] for view in traffic.mix}
+        start = time.perf_counter()
+        for _ in range(count):
+            view = traffic.choose()
+            request_start = time.perf_counter()
+            response = getattr(traffic, view)()
+            elapsed = (time.perf_counter() - request_start) * 1000
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{view}: ответ {response.status_code}'
+                )
+            match = QUERIES.search(response.get('Server-Timing', ''))
+            samples[view].append((elapsed, int(match[1]) if match else 0))
+        return samples, time.perf_counter() - start
+
+    def summary(self, samples, duration):
+        views = {}
+        for view, rows in samples.items():
+            if not rows:
+                continue
+            latencies = [latency for latency, _ in rows]
+            queries = [count for _, count in rows]
+            views[view] = {
+                'requests': len(rows),
+                **{
+                    f'p{rank}_ms': round(percentile(latencies, rank), 2)
+                    for rank in PERCENTILES
+                },
+                'avg_queries': round(sum(queries) / len(queries), 2),
+                'max_queries': max(queries),
+            }
+        latencies = [row[0] for rows in samples.values() for row in rows]
+        total = {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / duration, 1),
+            **{
+                f'p{rank}_ms': round(percentile(latencies, rank), 2)
+                for rank in PERCENTILES
+            },
+        }
+        return views, total
+
+    def report(self, views, total, previous=None):
+        previous = previous or {'views': {}, 'total': {}}
+        columns = ('requests', 'p50_ms', 'p95_ms', 'p99_ms', 'avg_queries')
+
+        def line(name, row, before):
+            cells = []
+            for column in columns:
+                cell = f'{row.get(column, "")}'
+                if column != 'requests' and column in before:
+                    cell += f' ({row[column] - before[column]:+.2f})'
+                cells.append(f'{cell:>18}')
+            return f'{name:<14}' + ''.join(cells)
+
+        self.stdout.write(
+            f'{"":<14}' + ''.join(f'{column:>18}' for column in columns)
+        )
+        for view, row in views.items():
+            self.stdout.write(
+                line(view, row, previous['views'].get(view, {}))
+            )
+        self.stdout.write(line('всего', total, previous['total']))
+        rps = f'RPS: {total["rps"]}'
+        if 'rps' in previous['total']:
+            rps += f' ({total["rps"] - previous["total"]["rps"]:+.1f})'
+        self.stdout.write(rps)
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+        rng = random.Random(options['seed'])
+        traffic = Traffic(rng, options['readers'], BENCHMARK_MIX)
+        self.run(traffic, options['warmup'])
+        samples, duration = self.run(traffic, options['requests'])
+        views, total = self.summary(samples, duration)
+        self.report(views, total, previous)
+
+        commit = current_commit()
+        created = timezone.now()
+        result = {
+            'commit': commit,
+            'created': created.isoformat(),
+            'options': {
+                name: options[name]
+                for name in ('requests', 'warmup', 'readers', 'seed')
+            },
+            'data': {
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': views,
+            'total': total,
+        }
+        os.makedirs(options['output'], exist_ok=True)
+        path = os.path.join(
+            options['output'],
+            f'{created:%Y%m%d-%H%M%S}-{commit}.json'
+        )
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {path}')
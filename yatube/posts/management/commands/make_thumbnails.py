@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры картинок постов, загруженных раньше'
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').values_list('pk', 'image')
+        total = 0
+        for post_id, name in posts.iterator():
+            generate(post_id, name)
+            total += 1
+        self.stdout.write(f'Обработано картинок: {total}')
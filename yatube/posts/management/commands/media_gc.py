@@ -0,0 +1,63 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from yatube.settings import MEDIA_GC_GRACE
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки постов, на которые не ссылается ни один пост'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено'
+        )
+        parser.add_argument(
+            '--grace', type=int, default=MEDIA_GC_GRACE,
+            help='Не трогать файлы моложе стольких секунд'
+        )
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        root = field.upload_to.rstrip('/')
+        if not storage.exists(root):
+            return
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        candidates = list(walk(storage, root))
+        referenced = set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        )
+        removed = freed = 0
+        for name in candidates:
+            # Время проверяется после снимка ссылок: повторная загрузка
+            # того же файла освежает его и спасает от удаления
+            if (
+                name in referenced
+                or storage.get_modified_time(name) >= cutoff
+            ):
+                continue
+            removed += 1
+            freed += storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+                continue
+            default.kvstore.delete(ImageFile(name, storage))
+            storage.delete(name)
+        self.stdout.write(
+            f'Файлов без ссылок: {removed}, освобождено байт: {freed}'
+        )
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post
+from users.models import Profile
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field, outer_field='pk'):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer_field)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики комментариев, постов и подписок'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        Profile.objects.bulk_create(
+            Profile(user=user)
+            for user in User.objects.filter(profile__isnull=True)
+        )
+        posts = Post.objects.update(
+            comments_count=count_subquery(Comment.objects.all(), 'post')
+        )
+        profiles = Profile.objects.update(
+            posts_count=count_subquery(
+                Post.objects.all(), 'author', 'user_id'
+            ),
+            followers_count=count_subquery(
+                Follow.objects.all(), 'author', 'user_id'
+            ),
+            following_count=count_subquery(
+                Follow.objects.all(), 'user', 'user_id'
+            )
+        )
+        self.stdout.write(
+            f'Пересчитано постов: {posts}, профилей: {profiles}'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import fts_enabled, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write('Полнотекстовый индекс есть только в SQLite')
+            return
+        rebuild_index()
+        self.stdout.write('Индекс постов перестроен')
@@ -0,0 +1,191 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.feed import rebuild_feeds
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'кот', 'собака', 'город', 'море', 'книга', 'поезд', 'утро', 'вечер',
+    'дорога', 'музыка', 'фильм', 'работа', 'дом', 'друг', 'лес', 'река',
+    'солнце', 'дождь', 'снег', 'кофе', 'чай', 'прогулка', 'отпуск',
+    'новости', 'спорт', 'погода', 'сад', 'школа', 'праздник', 'история',
+)
+PERIOD = timedelta(days=365)
+
+
+@contextmanager
+def explicit_dates(model):
+    """Даёт bulk_create записать даты модели как есть.
+
+    Без этого auto_now и auto_now_add заменили бы их текущим временем.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def next_pk(model):
+    return (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+
+
+def zipf_weights(size, exponent=1.1):
+    """Накопленные веса: k-й по популярности встречается в k^s раз реже."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'подписками и комментариями для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя'
+        )
+        parser.add_argument('--comments', type=int, default=2_000_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def insert(self, model, objects, batch_size, **kwargs):
+        batch = []
+        total = 0
+        with transaction.atomic(), explicit_dates(model):
+            for obj in objects:
+                batch.append(obj)
+                if len(batch) == batch_size:
+                    model.objects.bulk_create(batch, **kwargs)
+                    total += len(batch)
+                    batch = []
+            model.objects.bulk_create(batch, **kwargs)
+        total += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        now = timezone.now()
+        start = now - PERIOD
+
+        first_user = next_pk(User)
+        password = make_password('benchmark')
+        user_ids = list(range(first_user, first_user + options['users']))
+        self.insert(User, (
+            User(
+                pk=pk, username=f'user{pk}', password=password,
+                date_joined=start
+            )
+            for pk in user_ids
+        ), batch_size)
+
+        first_group = next_pk(Group)
+        group_ids = list(range(first_group, first_group + options['groups']))
+        self.insert(Group, (
+            Group(
+                pk=pk, title=f'Группа {pk}', slug=f'group-{pk}',
+                description=f'Описание группы {pk}'
+            )
+            for pk in group_ids
+        ), batch_size)
+
+        # Популярность авторов не зависит от порядка регистрации
+        authors = user_ids[:]
+        rng.shuffle(authors)
+        weights = zipf_weights(len(authors))
+
+        def follows():
+            for user_id in user_ids:
+                count = rng.randint(0, 2 * options['follows'])
+                chosen = set(
+                    rng.choices(authors, cum_weights=weights, k=count)
+                )
+                chosen.discard(user_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.insert(Follow, follows(), batch_size, ignore_conflicts=True)
+
+        posts = options['posts']
+        first_post = next_pk(Post)
+        step = PERIOD / max(posts, 1)
+
+        def post_date(index):
+            return start + step * index
+
+        def make_posts():
+            for index in range(posts):
+                pub_date = post_date(index)
+                yield Post(
+                    pk=first_post + index,
+                    author_id=rng.choices(authors, cum_weights=weights)[0],
+                    group_id=(
+                        rng.choice(group_ids)
+                        if group_ids and rng.random() < 0.7 else None
+                    ),
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                    pub_date=pub_date,
+                    updated=pub_date,
+                )
+
+        self.insert(Post, make_posts(), batch_size)
+
+        first_comment = next_pk(Comment)
+
+        def comments():
+            for offset in range(options['comments'] if posts else 0):
+                # Свежие посты обсуждают чаще старых
+                index = posts - 1 - int(posts * rng.random() ** 3)
+                pub_date = min(
+                    post_date(index) + timedelta(hours=rng.random() * 72),
+                    now
+                )
+                yield Comment(
+                    pk=first_comment + offset,
+                    path=Comment.path_step(first_comment + offset),
+                    post_id=first_post + index,
+                    author_id=rng.choice(user_ids),
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(3, 15))),
+                    pub_date=pub_date,
+                )
+
+        self.insert(Comment, comments(), batch_size)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Group, Post, Comment]
+            ):
+                cursor.execute(sql)
+        # bulk_create не вызывает сигналы: счётчики, ленты и поисковый
+        # индекс строятся заново по загруженным данным
+        call_command('rebuild_counters', stdout=self.stdout)
+        self.stdout.write(f'Записей в лентах: {rebuild_feeds()}')
+        call_command('rebuild_search_index', stdout=self.stdout)
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:30
+
+import re
+
+from django.db import migrations
+
+from posts.stemmer import stem
+
+WORD = re.compile(r'\w+')
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.using(schema_editor.connection.alias)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+            "text, tokenize = 'unicode61 remove_diacritics 0')"
+        )
+        cursor.executemany(
+            'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)',
+            (
+                (pk, ' '.join(stem(word) for word in WORD.findall(text)))
+                for pk, text in posts.values_list('pk', 'text').iterator()
+            )
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
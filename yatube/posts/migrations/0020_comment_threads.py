@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.http import int_to_base36
+
+
+def fill_paths(apps, schema_editor):
+    """Все старые комментарии — ответы на пост, путь из одного звена."""
+    Comment = apps.get_model('posts', 'Comment')
+    comments = Comment.objects.using(schema_editor.connection.alias)
+    batch = []
+    for pk in comments.values_list('pk', flat=True).iterator():
+        batch.append(Comment(pk=pk, path=int_to_base36(pk).zfill(8)))
+        if len(batch) == 1000:
+            comments.bulk_update(batch, ['path'])
+            batch = []
+    comments.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
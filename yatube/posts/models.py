@@ -1,8 +1,32 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.http import int_to_base36
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# Ширина одного звена пути комментария: его id в base36 с нулями слева,
+# чтобы пути сравнивались как строки в порядке дерева
+PATH_STEP = 8
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, comments=False):
+        """Посты для лент: автор и группа без N+1 запросов.
+
+        comments=True — ещё и комментарии для карточек, которые их
+        показывают (главная и лента подписок).
+        """
+        posts = self.select_related('author', 'group').defer(
+            'author__password', 'group__description'
+        )
+        if comments:
+            posts = posts.prefetch_related(models.Prefetch(
+                'comments', queryset=Comment.objects.select_related('author')
+            ))
+        return posts
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -19,6 +43,7 @@ class Group(models.Model):
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -32,11 +57,41 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', blank=True, null=True
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', blank=True, null=True
+    )
+    image_hash = models.CharField(
+        'Хэш картинки', max_length=64, blank=True
+    )
+    # Готовые миниатюры картинки в JSON (см. posts.thumbnails)
+    thumbnails = models.TextField(blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -53,12 +108,39 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self', blank=True, null=True,
+        on_delete=models.CASCADE,
+        related_name='replies'
+    )
+    # Звенья id всех предков и самого комментария (см. PATH_STEP):
+    # ветка целиком — это диапазон путей с общим префиксом
+    path = models.CharField(max_length=255, blank=True, editable=False)
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('post', 'pub_date'), name='comment_post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('post', 'path'), name='comment_post_path_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
+    @staticmethod
+    def path_step(pk):
+        return int_to_base36(pk).zfill(PATH_STEP)
+
+    @property
+    def depth(self):
+        """0 у ответа на пост, 1 у ответа на комментарий и т. д."""
+        return max(len(self.path) // PATH_STEP - 1, 0)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -72,5 +154,52 @@ class Follow(models.Model):
         related_name='following'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        ]
+
     def __str__(self):
         return str(self.user.username)
+
+
+class FeedEntry(models.Model):
+    """Запись в ленте подписок читателя, добавленная при публикации поста."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Копия Post.pub_date: страница ленты читается по индексу записей
+    # читателя без сортировки всей ленты
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('user', 'author')),
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_entry_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
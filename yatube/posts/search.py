@@ -0,0 +1,126 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — виртуальная таблица SQLite FTS5, в которой под rowid поста
+лежат основы слов его текста. Сигналы на сохранение и удаление Post
+держат индекс в актуальном состоянии; на других СУБД поиск сводится
+к icontains.
+"""
+import re
+
+from django.db import connections, router
+
+from .models import Post
+from .stemmer import stem
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+MAX_TERMS = 10
+
+
+def to_index(text):
+    return ' '.join(stem(word) for word in WORD.findall(text))
+
+
+def match_expression(query):
+    """Запрос FTS5: все основы слов запроса, каждая как префикс."""
+    terms = [stem(word) for word in WORD.findall(query)][:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def read_connection():
+    """Соединение, с которого читаются посты: реплика или основная база."""
+    return connections[router.db_for_read(Post)]
+
+
+def write_connection():
+    return connections[router.db_for_write(Post)]
+
+
+def fts_enabled():
+    return write_connection().vendor == 'sqlite'
+
+
+def index_post(post):
+    if not fts_enabled():
+        return
+    with write_connection().cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, to_index(post.text)]
+        )
+
+
+def unindex_post(post_id):
+    if not fts_enabled():
+        return
+    with write_connection().cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild_index(batch_size=1000):
+    """Заново строит индекс по всем постам."""
+    connection = write_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        batch = []
+        posts = Post.objects.using(connection.alias).values_list(
+            'pk', 'text'
+        ).order_by()
+        for row in posts.iterator(chunk_size=batch_size):
+            batch.append((row[0], to_index(row[1])))
+            if len(batch) == batch_size:
+                cursor.executemany(
+                    f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+                    batch
+                )
+                batch = []
+        if batch:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', batch
+            )
+
+
+class SearchResults:
+    """Найденные посты в порядке релевантности (bm25).
+
+    Поддерживает count() и срезы, поэтому с ней работает пагинатор:
+    страница — это один запрос к индексу и один к постам.
+    """
+
+    def __init__(self, query):
+        self.expression = match_expression(query)
+        # По query пагинатор строит ключ кэша числа результатов
+        self.query = f'{TABLE} MATCH {self.expression}'
+
+    def count(self):
+        if not self.expression:
+            return 0
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.expression]
+            )
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        if not self.expression or index.stop is None or index.stop <= start:
+            return []
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [self.expression, index.stop - start, start]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query):
+    if fts_enabled():
+        return SearchResults(query)
+    return Post.objects.for_feed().filter(text__icontains=query)
@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.routers import primary
+from users.models import Profile
+from .cache import evict
+from .feed import fan_out, refill_author, unfollowed
+from .images import normalize_image
+from .models import Comment, Follow, Group, Post, User
+from .search import index_post, unindex_post
+from .thumbnails import schedule, thumbnails_ready
+
+
+def change_profile_counter(user_id, field, delta):
+    # Профиль создаётся вместе с пользователем (users.signals)
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f'{field}__gte': -delta})
+    profiles.update(**{field: F(field) + delta})
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(
+        comments_count=F('comments_count') + delta, updated=timezone.now()
+    )
+
+
+def evict_post_pages(post, *extra_scopes):
+    scopes = ['index', f'post:{post.pk}', f'profile:{post.author.username}']
+    if post.group is not None:
+        scopes.append(f'group:{post.group.slug}')
+    evict(*scopes, *extra_scopes)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_hash = ''
+    elif not instance.image._committed:
+        (
+            instance.image, instance.image_width,
+            instance.image_height, instance.image_hash
+        ) = normalize_image(instance.image.file, instance.image.name)
+    if instance.pk is None:
+        return
+    previous = Post.objects.filter(pk=instance.pk).values(
+        'group__slug', 'image'
+    ).first() or {}
+    instance.previous_group_slug = previous.get('group__slug')
+    instance.previous_image = previous.get('image')
+    if instance.image.name != instance.previous_image:
+        instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_group = getattr(instance, 'previous_group_slug', None)
+    evict_post_pages(
+        instance, *([f'group:{previous_group}'] if previous_group else [])
+    )
+    index_post(instance)
+    if created:
+        change_profile_counter(instance.author_id, 'posts_count', 1)
+        fan_out(instance)
+    if instance.image and instance.image.name != getattr(
+        instance, 'previous_image', None
+    ):
+        post_id, name = instance.pk, instance.image.name
+        transaction.on_commit(lambda: schedule(post_id, name))
+
+
+@receiver(thumbnails_ready, sender=Post)
+def post_thumbnails_ready(sender, post_id, **kwargs):
+    # Приходит из потока пула сразу после записи миниатюр: реплика
+    # могла ещё не получить пост, поэтому читаем из основной базы
+    with primary():
+        post = Post.objects.select_related('author', 'group').filter(
+            pk=post_id
+        ).first()
+    if post is not None:
+        Post.objects.filter(pk=post_id).update(updated=timezone.now())
+        evict_post_pages(post)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_profile_counter(instance.author_id, 'posts_count', -1)
+    unindex_post(instance.pk)
+    evict_post_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # Путь строится из id, поэтому дописывается после вставки
+        parent_path = instance.parent.path if instance.parent_id else ''
+        instance.path = parent_path + Comment.path_step(instance.pk)
+        Comment.objects.filter(pk=instance.pk).update(path=instance.path)
+    if created and not raw and instance.post_id is not None:
+        change_comments_count(instance.post_id, 1)
+        evict('index', f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        change_comments_count(instance.post_id, -1)
+        evict('index', f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Название группы выводится и в карточках ленты
+        evict('index', f'group:{instance.slug}')
+
+
+def evict_follow_pages(*usernames):
+    evict(*(f'profile:{username}' for username in usernames))
+
+
+def follow_removed(user_id, author_id):
+    change_profile_counter(user_id, 'following_count', -1)
+    change_profile_counter(author_id, 'followers_count', -1)
+    # Автор снова не выше порога: его посты больше не подмешиваются
+    # при чтении, поэтому раскладываются по лентам
+    refill_author(author_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_profile_counter(instance.user_id, 'following_count', 1)
+        change_profile_counter(instance.author_id, 'followers_count', 1)
+        # Читатель и автор уже загружены представлением
+        evict_follow_pages(instance.user.username, instance.author.username)
+
+
+@receiver(unfollowed, sender=Follow)
+def follow_unfollowed(sender, user, author_id, username, **kwargs):
+    follow_removed(user.pk, author_id)
+    evict_follow_pages(user.username, username)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # Удаление из админки или каскадом: пользователя уже может не быть
+    follow_removed(instance.user_id, instance.author_id)
+    evict_follow_pages(*User.objects.filter(
+        pk__in=(instance.user_id, instance.author_id)
+    ).values_list('username', flat=True))
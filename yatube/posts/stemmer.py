@@ -0,0 +1,79 @@
+"""Стеммер Портера (Snowball) для русского языка.
+
+Поисковый индекс хранит основы слов, поэтому «котов», «коту» и «кот»
+находятся одним запросом.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'(?:(?<=[ая])(?:вшись|вши|в)|(?:ившись|ывшись|ивши|ывши|ив|ыв))$'
+)
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE = (
+    r'(?:ими|ыми|его|ого|ему|ому|ее|ие|ые|ое|ей|ий|ый|ой|ем|им|ым|ом'
+    r'|их|ых|ую|юю|ая|яя|ою|ею)'
+)
+ADJECTIVAL = re.compile(
+    r'(?:(?<=[ая])(?:ем|нн|вш|ющ|щ)|(?:ивш|ывш|ующ))?' + ADJECTIVE + '$'
+)
+VERB = re.compile(
+    r'(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    r'|(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило'
+    r'|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$'
+)
+NOUN = re.compile(
+    r'(?:иями|ями|ами|ией|иям|ием|иях|ев|ов|ие|ье|еи|ии|ей|ой|ий|ям|ем'
+    r'|ам|ом|ах|ях|ию|ью|ия|ья|а|е|и|й|о|у|ы|ь|ю|я)$'
+)
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+
+
+def region(word, start):
+    """Начало области после первой пары «гласная — согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv = next(
+        (i + 1 for i, letter in enumerate(word) if letter in VOWELS),
+        len(word)
+    )
+    r2 = region(word, region(word, 0))
+    prefix, rest = word[:rv], word[rv:]
+
+    match = PERFECTIVE_GERUND.search(rest)
+    if match:
+        rest = rest[:match.start()]
+    else:
+        rest = REFLEXIVE.sub('', rest)
+        for ending in (ADJECTIVAL, VERB, NOUN):
+            match = ending.search(rest)
+            if match:
+                rest = rest[:match.start()]
+                break
+
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    match = DERIVATIONAL.search(rest)
+    if match and rv + match.start() >= r2:
+        rest = rest[:match.start()]
+
+    if rest.endswith('нн'):
+        rest = rest[:-1]
+    else:
+        match = SUPERLATIVE.search(rest)
+        if match:
+            rest = rest[:match.start()]
+            if rest.endswith('нн'):
+                rest = rest[:-1]
+        elif rest.endswith('ь'):
+            rest = rest[:-1]
+    return prefix + rest
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Post
+from posts.search import search_posts
+from users.models import Profile
+
+BENCHMARK_DIR = tempfile.mkdtemp()
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_posts', '--users=30', '--groups=3', '--posts=200',
+            '--follows=3', '--comments=300', stdout=StringIO()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(BENCHMARK_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_builds_consistent_data(self):
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        post = Post.objects.order_by('-comments_count').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        profile = Profile.objects.get(user=post.author)
+        self.assertEqual(profile.posts_count, post.author.posts.count())
+        follow = Follow.objects.first()
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user=follow.user, author=follow.author
+            ).count(),
+            follow.author.posts.count()
+        )
+        self.assertGreater(
+            Post.objects.order_by('pub_date').last().pub_date,
+            Post.objects.order_by('pub_date').first().pub_date
+        )
+        self.assertTrue(search_posts(post.text.split()[0]).count())
+
+    def test_benchmark_stores_comparable_results(self):
+        options = ('--requests=60', '--warmup=5', '--readers=5')
+        call_command(
+            'benchmark_posts', *options, f'--output={BENCHMARK_DIR}',
+            stdout=StringIO()
+        )
+        [name] = os.listdir(BENCHMARK_DIR)
+        path = os.path.join(BENCHMARK_DIR, name)
+        with open(path, encoding='utf-8') as file:
+            result = json.load(file)
+        self.assertEqual(result['total']['requests'], 60)
+        for stats in result['views'].values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertGreater(stats['avg_queries'], 0)
+        out = StringIO()
+        call_command(
+            'benchmark_posts', *options, f'--output={BENCHMARK_DIR}',
+            f'--compare={path}', stdout=out
+        )
+        self.assertRegex(out.getvalue(), r'RPS: [\d.]+ \([+-]')
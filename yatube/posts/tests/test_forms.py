@@ -1,13 +1,19 @@
+import hashlib
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Comment, Group, Post
+from yatube.settings import IMAGE_MAX_SIZE
 
 User = get_user_model()
 
@@ -77,6 +83,8 @@ class PostCreateFormTests(TestCase):
         )
 
     def test_create_post_with_img(self):
+        digest = hashlib.sha256(self.small_gif).hexdigest()
+        stored_name = f'posts/{digest[:2]}/{digest}.gif'
         form_data = {
             'text': 'Тестовый текст',
             'image': self.uploaded
@@ -89,7 +97,7 @@ class PostCreateFormTests(TestCase):
         self.assertTrue(
             Post.objects.filter(
                 text='Тестовый текст',
-                image=f'posts/{self.uploaded.name}'
+                image=stored_name
             ).exists()
         )
         self.assertEqual('image/gif', self.uploaded.content_type)
@@ -97,7 +105,36 @@ class PostCreateFormTests(TestCase):
         response_test_text = response_1.text
         response_test_image = response_1.image
         self.assertEqual(response_test_text, form_data['text'])
-        self.assertEqual(response_test_image, f'posts/{self.uploaded.name}')
+        self.assertEqual(response_test_image, stored_name)
+
+    def test_uploaded_photo_is_normalized(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        exif[0x0112] = 6
+        photo = BytesIO()
+        Image.new('RGB', (4000, 1000), 'red').save(photo, 'JPEG', exif=exif)
+        self.authorized_client.post(
+            reverse('posts:create_post'),
+            data={
+                'text': 'Фото с телефона',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', photo.getvalue(), content_type='image/jpeg'
+                )
+            }
+        )
+        post = Post.objects.get(text='Фото с телефона')
+        self.assertEqual(
+            (post.image_width, post.image_height),
+            (IMAGE_MAX_SIZE // 4, IMAGE_MAX_SIZE)
+        )
+        with open(post.image.path, 'rb') as stored:
+            data = stored.read()
+        self.assertEqual(post.image_hash, hashlib.sha256(data).hexdigest())
+        with Image.open(BytesIO(data)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (post.image_width, post.image_height))
+            self.assertNotIn('exif', image.info)
+            self.assertTrue(image.info.get('progressive'))
 
     def test_post_edit(self):
         post = PostCreateFormTests.post
@@ -142,3 +179,64 @@ class PostCreateFormTests(TestCase):
                 text=form_data['text'], post_id=post_id).exists()
         )
         self.assertEqual(response.status_code, 302)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, color):
+        image = BytesIO()
+        Image.new('RGB', (20, 10), color).save(image, 'JPEG')
+        return SimpleUploadedFile(
+            'image.jpg', image.getvalue(), content_type='image/jpeg'
+        )
+
+    def media_gc(self, *args):
+        call_command('media_gc', '--grace=0', *args, stdout=StringIO())
+
+    def test_duplicate_uploads_share_one_file(self):
+        first = Post.objects.create(
+            author=self.user, text='Первый', image=self.upload('red')
+        )
+        second = Post.objects.create(
+            author=self.user, text='Второй', image=self.upload('red')
+        )
+        other = Post.objects.create(
+            author=self.user, text='Другой', image=self.upload('blue')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertIn(first.image_hash, first.image.name)
+
+    def test_media_gc_removes_only_orphans(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('red')
+        )
+        copy = Post.objects.create(
+            author=self.user, text='Копия', image=self.upload('red')
+        )
+        old_path = post.image.path
+        post.image = self.upload('blue')
+        post.save()
+        copy.delete()
+        self.media_gc('--dry-run')
+        self.assertTrue(os.path.exists(old_path))
+        self.media_gc()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_media_gc_keeps_recent_files(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.upload('red')
+        )
+        path = post.image.path
+        post.delete()
+        call_command('media_gc', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
@@ -1,7 +1,16 @@
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from posts.models import Group, Post
+from posts.feed import backfill, follow_feed
+from posts.models import Comment, Follow, Group, Post
+from yatube.utils import KeysetPaginator
 
 User = get_user_model()
 
@@ -29,3 +38,145 @@ class PostModelTest(TestCase):
     def test_group_title_str(self):
         title = PostModelTest.group.title
         self.assertEqual(title, str(title))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+
+    def test_counters_follow_create_and_delete(self):
+        post = Post.objects.create(author=self.user, text='Тестовый текст')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.user.profile.posts_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.posts_count, 0)
+
+    def test_profile_is_created_with_user(self):
+        user = User.objects.create_user(username='new_user')
+        self.assertEqual(user.profile.posts_count, 0)
+        self.assertEqual(user.profile.followers_count, 0)
+
+    def test_follower_counter_follows_every_kind_of_unfollow(self):
+        readers = [
+            User.objects.create_user(username=f'reader_{num}')
+            for num in range(3)
+        ]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.user)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.followers_count, 3)
+        readers[0].profile.refresh_from_db()
+        self.assertEqual(readers[0].profile.following_count, 1)
+        Follow.objects.get(user=readers[0]).delete()
+        readers[0].profile.refresh_from_db()
+        self.assertEqual(readers[0].profile.following_count, 0)
+        readers[1].delete()
+        self.client.force_login(readers[2])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.user.username])
+        )
+        readers[2].profile.refresh_from_db()
+        self.assertEqual(readers[2].profile.following_count, 0)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.followers_count, 0)
+
+    def test_rebuild_counters(self):
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Тестовый текст {num}')
+            for num in range(3)
+        ])
+        post = Post.objects.first()
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.user, text='Комментарий')
+            for num in range(2)
+        ])
+        author = User.objects.create_user(username='author')
+        Follow.objects.bulk_create([Follow(user=self.user, author=author)])
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        profile = User.objects.get(pk=self.user.pk).profile
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(profile.posts_count, 3)
+        self.assertEqual(profile.following_count, 1)
+        author = User.objects.get(pk=author.pk)
+        self.assertEqual(author.profile.followers_count, 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса SQLite')
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='заголовок поста',
+            slug='test_slug',
+            description='Описание поста'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
+        )
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_feeds_use_indexes_without_sorting(self):
+        feeds = {
+            'post_pub_date_idx': Post.objects.for_feed(),
+            'post_group_pub_date_idx': self.group.posts.for_feed(),
+            'post_author_pub_date_idx': self.user.posts.for_feed(),
+        }
+        for index, queryset in feeds.items():
+            with self.subTest(index=index):
+                plan = self.query_plan(
+                    queryset.order_by('-pub_date', '-pk')[:11]
+                )
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_feed_pages_read_feed_index_without_sorting(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        backfill(reader, self.user)
+        Post.objects.create(author=self.user, text='Второй пост')
+        posts, key = follow_feed(reader)
+        paginator = KeysetPaginator(posts, 1, key=key)
+        with CaptureQueriesContext(connection) as queries:
+            first = paginator.get_page(None)
+            second = paginator.cursor_page(
+                paginator.encode_cursor('next', first[0])
+            )
+        self.assertEqual(second[0], self.post)
+        pages = [
+            query['sql'] for query in queries.captured_queries
+            if 'ORDER BY' in query['sql']
+        ]
+        self.assertEqual(len(pages), 2)
+        for sql in pages:
+            with self.subTest(sql=sql):
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = ' '.join(str(row[-1]) for row in cursor)
+                self.assertIn('feed_entry_pub_date_idx', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_comments_use_index(self):
+        plan = self.query_plan(
+            Comment.objects.filter(post=self.post).order_by('pub_date')
+        )
+        self.assertIn('comment_post_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
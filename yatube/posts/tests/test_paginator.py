@@ -0,0 +1,196 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Page
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.cache import evict
+from posts.models import Group, Post
+from yatube.settings import PAGINATOR_LIST
+from yatube.utils import ELLIPSIS, CachedCountPaginator, elided_page_range
+
+User = get_user_model()
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='Текст поста',
+            slug='test_slug',
+            description='Описание поста'
+        )
+        Post.objects.bulk_create([
+            Post(
+                author=cls.user,
+                text=f'Тестовый текст {num}',
+                group=cls.group
+            )
+            for num in range(1, 26)]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def walk(self, url):
+        seen = []
+        response = self.client.get(url)
+        page_obj = response.context['page_obj']
+        seen.extend(page_obj)
+        while page_obj.next_cursor:
+            response = self.client.get(url, {'cursor': page_obj.next_cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+        return seen, page_obj
+
+    def test_cursor_walk_returns_every_post_once(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                seen, last_page = self.walk(url)
+                self.assertEqual(seen, expected)
+                self.assertFalse(last_page.has_next())
+                self.assertTrue(last_page.has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), PAGINATOR_LIST)
+        self.assertEqual(list(back), list(first))
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_cursor_links_rendered(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        page_obj = self.client.get(url).context['page_obj']
+        response = self.client.get(url)
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        Post.objects.bulk_create([
+            Post(author=cls.user, text=f'Тестовый текст {num}')
+            for num in range(1, 16)]
+        )
+        call_command('rebuild_counters', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        counts = [
+            q for q in queries
+            if q['sql'].startswith('SELECT COUNT(')
+            and 'FROM "posts_post"' in q['sql']
+        ]
+        return response, len(counts)
+
+    def test_count_is_cached_between_requests(self):
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        response, counts = self.count_queries(url)
+        self.assertEqual(response.context['post_counter'], 15)
+        self.assertLessEqual(counts, 1)
+        evict(f'profile:{self.user.username}')
+        response, counts = self.count_queries(url)
+        self.assertEqual(response.context['post_counter'], 15)
+        self.assertEqual(counts, 0)
+
+    def test_last_page_needs_no_count(self):
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        response, counts = self.count_queries(url + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertEqual(response.context['post_counter'], 15)
+        self.assertEqual(counts, 0)
+
+    def test_stale_count_is_corrected_by_page(self):
+        paginator = CachedCountPaginator(
+            Post.objects.all(), PAGINATOR_LIST, count=3
+        )
+        page_obj = paginator.get_page(1)
+        self.assertTrue(page_obj.has_next())
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_page_past_the_end_with_known_count_needs_no_count(self):
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        response, counts = self.count_queries(url + '?page=99')
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertEqual(counts, 0)
+
+    def test_page_past_the_end_with_stale_count_is_recounted(self):
+        paginator = CachedCountPaginator(
+            Post.objects.all(), PAGINATOR_LIST, count=50
+        )
+        page_obj = paginator.get_page(99)
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(paginator.count, 15)
+
+
+class ElidedPageRangeTests(TestCase):
+    def get_range(self, number, count):
+        paginator = CachedCountPaginator(
+            Post.objects.all(), PAGINATOR_LIST, count=count
+        )
+        return list(elided_page_range(Page([], number, paginator)))
+
+    def test_short_range_is_not_elided(self):
+        self.assertEqual(self.get_range(1, 50), [1, 2, 3, 4, 5])
+
+    def test_window_around_current_page(self):
+        self.assertEqual(
+            self.get_range(50, 1000),
+            [1, 2, ELLIPSIS, 47, 48, 49, 50, 51, 52, 53, ELLIPSIS, 99, 100]
+        )
+        self.assertEqual(
+            self.get_range(1, 1000),
+            [1, 2, 3, 4, ELLIPSIS, 99, 100]
+        )
+        self.assertEqual(
+            self.get_range(100, 1000),
+            [1, 2, ELLIPSIS, 97, 98, 99, 100]
+        )
+
+    def test_paginator_template_renders_window(self):
+        user = User.objects.create_user(username='auth_user')
+        Post.objects.bulk_create([
+            Post(author=user, text=f'Тестовый текст {num}')
+            for num in range(1, 301)]
+        )
+        call_command('rebuild_counters', stdout=StringIO())
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': user}),
+            {'page': 15}
+        )
+        self.assertContains(response, 'class="page-link" href="?page=', 12)
+        self.assertContains(response, ELLIPSIS, 2)
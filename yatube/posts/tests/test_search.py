@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post
+from posts.stemmer import stem
+from yatube.settings import PAGINATOR_LIST
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        forms = (
+            ('кот', 'котов', 'коту', 'коты'),
+            ('красивая', 'красивый', 'красивые'),
+            ('программирование', 'программированием'),
+        )
+        for words in forms:
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.cat_post = Post.objects.create(
+            author=cls.user, text='Рыжий кот спит на окне'
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.user, text='Собака охраняет двор'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'), {'q': query, **params})
+
+    def test_finds_other_word_forms(self):
+        response = self.search('рыжих котов')
+        self.assertEqual(list(response.context['page_obj']), [self.cat_post])
+
+    def test_index_follows_edit_and_delete(self):
+        self.dog_post.text = 'Собака гоняет котов'
+        self.dog_post.save()
+        found = self.search('кот').context['page_obj']
+        self.assertEqual(set(found), {self.cat_post, self.dog_post})
+        self.cat_post.delete()
+        found = self.search('кот').context['page_obj']
+        self.assertEqual(list(found), [self.dog_post])
+
+    def test_results_are_ranked_and_paginated(self):
+        for num in range(PAGINATOR_LIST):
+            Post.objects.create(author=self.user, text=f'Пост {num} про кошку')
+        Post.objects.create(author=self.user, text='кошка кошки кошкой')
+        response = self.search('кошка')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0].text, 'кошка кошки кошкой')
+        self.assertContains(
+            response, '?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0&amp;page=2'
+        )
+
+    def test_empty_query_shows_form(self):
+        response = self.search('')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['page_obj'])
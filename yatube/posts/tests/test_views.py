@@ -1,15 +1,29 @@
+import shutil
+import tempfile
+import time
+from unittest import mock
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Comment, Follow, Group, Post
-from yatube.settings import PAGINATOR_LIST
+from posts.cache import evict
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.thumbnails import generate
+from yatube.settings import (
+    COMMENTS_MAX_DEPTH, COMMENTS_PER_PAGE, PAGE_CACHE_TIMEOUT, PAGINATOR_LIST
+)
 
 User = get_user_model()
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostPagesTests(TestCase):
     @classmethod
@@ -277,7 +291,8 @@ class Sprint_final_tests(TestCase):
         index_content_1 = response_index.content
         post = response_index.context['page_obj'][0]
         self.assertEqual(post.text, 'Пост для проверки кэша')
-        post.delete()
+        # update() не вызывает сигналов, и страница остаётся в кэше
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
         response_index_2 = self.client.get(reverse('posts:index'))
         index_content_2 = response_index_2.content
         self.assertEqual(index_content_1, index_content_2, 'не работает')
@@ -325,3 +340,712 @@ class Sprint_final_tests(TestCase):
                     else:
                         post = response.context['page_obj']
                 self.assertContains(response, '<img', status_code=200)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FeedQueryCountTests(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.commentator = User.objects.create_user(username='commentator')
+        cls.group = Group.objects.create(
+            title='Текст поста',
+            slug='test_slug',
+            description='Описание поста'
+        )
+        Follow.objects.create(user=cls.commentator, author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.commentator)
+
+    def add_posts(self, count):
+        """Посты с картинками, комментариями и ответами на них.
+
+        Миниатюры готовы у всех постов, кроме каждого третьего.
+        """
+        for num in range(count):
+            post = Post.objects.create(
+                author=self.user,
+                text=f'Тестовый текст {num}',
+                group=self.group,
+                image=SimpleUploadedFile(
+                    'small.gif', self.small_gif, content_type='image/gif'
+                )
+            )
+            if num % 3:
+                generate(post.pk, post.image.name)
+            comment = Comment.objects.create(
+                post=post, author=self.commentator, text='Комментарий'
+            )
+            Comment.objects.create(
+                post=post, author=self.user, parent=comment, text='Ответ'
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_only_feeds_showing_comments_load_them(self):
+        self.add_posts(2)
+        urls = {
+            reverse('posts:index'): True,
+            reverse('posts:follow_index'): True,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}):
+                False,
+            reverse('posts:profile', kwargs={'username': self.user}): False,
+            reverse('posts:search') + '?q=Тестовый': False,
+        }
+        for url, with_comments in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(url)
+                self.assertEqual(
+                    any(
+                        'FROM "posts_comment"' in query['sql']
+                        for query in queries
+                    ),
+                    with_comments
+                )
+
+    def test_feed_query_count_does_not_depend_on_posts_number(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        )
+        self.add_posts(1)
+        small = {url: self.count_queries(url) for url in urls}
+        # Ровно одна полная страница: до второй пагинатор не считает записи
+        self.add_posts(PAGINATOR_LIST - 1)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def follow(self):
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_unfollow_prunes_feed(self):
+        self.follow()
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_follow_and_unfollow_make_no_extra_queries(self):
+        # Сессия, читатель, автор; SAVEPOINT, подписка, два счётчика,
+        # лента, RELEASE — без проверок профиля и догрузки пользователей
+        with self.assertNumQueries(9):
+            self.follow()
+        # Сессия, читатель; SAVEPOINT, id автора, DELETE подписки без
+        # выборки, лента, два счётчика, дозаполнение лент, RELEASE
+        with self.assertNumQueries(10):
+            self.client.get(
+                reverse('posts:profile_unfollow', args=[self.author.username])
+            )
+
+    def test_profile_shows_follow_counters_without_counting(self):
+        self.follow()
+        cache.clear()
+        url = reverse('posts:profile', args=[self.author.username])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Подписан: 0')
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] and 'posts_follow' in query['sql']
+            for query in queries
+        ))
+
+    def test_repeated_follow_keeps_one_row(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.follow()
+        follows = Follow.objects.filter(user=self.reader, author=self.author)
+        self.assertEqual(follows.count(), 1)
+
+    def test_unfollow_not_followed_author(self):
+        response = self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[self.author.username])
+        )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_author_back_under_threshold_keeps_posts_in_feeds(self):
+        self.follow()
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=new_post).exists()
+        )
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_popular_author_is_read_on_the_fly(self):
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.other = User.objects.create_user(username='other_user')
+        cls.group = Group.objects.create(
+            title='Текст поста',
+            slug='test_slug',
+            description='Описание поста'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def rendered(self, response):
+        return 'posts/index.html' in (t.name for t in response.templates)
+
+    def test_post_delete_evicts_its_pages(self):
+        post = Post.objects.create(
+            author=self.user, text='Удаляемый пост', group=self.group
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        detail = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        for url in (*urls, detail):
+            self.assertContains(self.client.get(url), 'Удаляемый пост')
+        post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.client.get(url), 'Удаляемый пост')
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+    def test_comment_delete_evicts_post_page(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.other, text='Удаляемый комментарий'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertContains(self.author_client.get(url), 'Удаляемый комм')
+        comment.delete()
+        self.assertNotContains(self.author_client.get(url), 'Удаляемый комм')
+
+    def test_group_save_evicts_group_page(self):
+        group = Group.objects.create(
+            title='Группа', slug='renamed', description='Старое описание'
+        )
+        url = reverse('posts:group_list', kwargs={'slug': group.slug})
+        self.assertContains(self.client.get(url), 'Старое описание')
+        group.description = 'Новое описание'
+        group.save()
+        self.assertContains(self.client.get(url), 'Новое описание')
+
+    def test_group_and_author_changes_reach_cached_cards(self):
+        author = User.objects.create_user(username='old_name')
+        group = Group.objects.create(title='Старое название', slug='cards')
+        Post.objects.create(author=author, group=group, text='Карточка')
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), 'Старое название')
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.client.get(url), 'Новое название')
+        author.username = 'new_name'
+        author.save()
+        evict('index')
+        self.assertContains(
+            self.client.get(url), reverse('posts:profile', args=['new_name'])
+        )
+        group.delete()
+        self.assertNotContains(self.client.get(url), 'Новое название')
+
+    def test_anonymous_pages_are_shared(self):
+        url = reverse('posts:index')
+        self.assertTrue(self.rendered(self.client.get(url)))
+        self.assertFalse(self.rendered(Client().get(url)))
+
+    def test_page_shell_is_shared_by_all_users(self):
+        url = reverse('posts:index')
+        self.assertTrue(self.rendered(self.client.get(url)))
+        for client, user in (
+            (self.author_client, self.user), (self.other_client, self.other)
+        ):
+            with self.subTest(user=user):
+                response = client.get(url)
+                self.assertFalse(self.rendered(response))
+                self.assertContains(response, f'Пользователь: {user}')
+                self.assertContains(response, 'Избранные авторы')
+        edit_link = 'Редактировать запись'
+        self.assertContains(self.author_client.get(url), edit_link)
+        self.assertNotContains(self.other_client.get(url), edit_link)
+        self.assertNotContains(self.client.get(url), edit_link)
+        self.assertNotContains(self.client.get(url), '<!--hole:')
+
+    def test_personal_fragments_of_post_and_profile(self):
+        post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}
+        )
+        profile_url = reverse('posts:profile', kwargs={'username': self.user})
+        for url in (post_url, profile_url):
+            self.client.get(url)
+        response = self.other_client.get(post_url)
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, 'Комментарии к посту')
+        response = self.client.get(post_url)
+        self.assertNotContains(response, 'Добавить комментарий')
+        self.assertNotContains(response, 'Комментарии к посту')
+        self.assertContains(
+            self.author_client.get(profile_url), 'Это ваша страница'
+        )
+        Follow.objects.create(user=self.other, author=self.user)
+        self.assertContains(self.other_client.get(profile_url), 'Отписаться')
+
+    def test_create_form_is_not_cached(self):
+        url = reverse('posts:create_post')
+        self.author_client.get(url)
+        response = self.other_client.get(url)
+        self.assertEqual(response.context['user'], self.other)
+
+    def test_edit_evicts_pages(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            self.other_client.get(url)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            {'text': 'Новый текст', 'group': self.group.id}
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.other_client.get(url), 'Новый текст')
+
+    def test_comment_evicts_post_detail(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.author_client.get(url)
+        self.other_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Свежий комментарий'}
+        )
+        self.assertContains(self.author_client.get(url), 'Свежий комментарий')
+
+    def test_stale_page_is_served_while_another_worker_renders(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.other, text='Свежий пост')
+        # Блокировку на пересборку страницы держит другой процесс
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.client.get(url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertIn('stale 1', response['Server-Timing'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(self.client.get(url), 'Свежий пост')
+
+    def test_writer_does_not_get_stale_page(self):
+        url = reverse('posts:index')
+        self.author_client.get(url)
+        self.author_client.post(
+            reverse('posts:create_post'), {'text': 'Мой новый пост'}
+        )
+        with mock.patch.object(cache, 'add', return_value=False):
+            response = self.author_client.get(url)
+        self.assertContains(response, 'Мой новый пост')
+
+    def test_expired_page_is_rendered_once(self):
+        url = reverse('posts:index')
+        with mock.patch('posts.cache.random.uniform', return_value=0):
+            self.client.get(url)
+        later = time.time() + PAGE_CACHE_TIMEOUT + 1
+        with mock.patch('posts.cache.time.time', return_value=later):
+            with mock.patch.object(cache, 'add', return_value=False):
+                self.assertFalse(self.rendered(self.client.get(url)))
+            self.assertTrue(self.rendered(self.client.get(url)))
+            self.assertFalse(self.rendered(self.client.get(url)))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test_slug', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый текст', group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            {'text': 'Новый текст', 'group': self.group.id}
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Новый текст')
+
+    def test_comment_invalidates_post_detail(self):
+        url = self.urls[-1]
+        etag = self.author_client.get(url)['ETag']
+        self.author_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Свежий комментарий'}
+        )
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий комментарий')
+
+    def test_validators_depend_on_viewer(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        response = self.author_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        authors = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(3)
+        ]
+        for number in range(COMMENTS_PER_PAGE * 2 + 5):
+            Comment.objects.create(
+                post=cls.post, author=authors[number % 3],
+                text=f'Комментарий №{number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_post_detail_shows_first_page(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий №0')
+        self.assertContains(response, 'Показать ещё комментарии')
+        self.assertNotContains(response, f'Комментарий №{COMMENTS_PER_PAGE}<')
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+
+    def test_load_more_follows_cursor(self):
+        url = reverse('posts:comments', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['next_cursor']
+        response = self.client.get(url, {'cursor': cursor})
+        comments = response.context['comments']
+        self.assertEqual(comments[0].text, f'Комментарий №{COMMENTS_PER_PAGE}')
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        response = self.client.get(
+            url, {'cursor': response.context['next_cursor']}
+        )
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertNotContains(response, 'Показать ещё комментарии')
+
+    def test_load_more_for_missing_post(self):
+        url = reverse('posts:comments', kwargs={'post_id': 0})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_guest_cannot_load_comments(self):
+        url = reverse('posts:comments', kwargs={'post_id': self.post.id})
+        self.client.get(url)
+        self.client.logout()
+        thread = Comment.objects.filter(post=self.post).first()
+        for params in ({}, {'thread': thread.pk}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertRedirects(
+                    response,
+                    f'{reverse("users:login")}?next={url}'
+                    + (f'%3Fthread%3D{thread.pk}' if params else '')
+                )
+                self.assertNotContains(
+                    response, 'Комментарий', status_code=302
+                )
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.first = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Первый'
+        )
+        cls.second = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Второй'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def reply(self, parent, text, post=None):
+        post = post or self.post
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            {'text': text, 'parent': parent.pk}
+        )
+        return Comment.objects.filter(text=text).first()
+
+    def test_reply_extends_parent_path(self):
+        reply = self.reply(self.first, 'Ответ')
+        self.assertEqual(reply.parent, self.first)
+        self.assertTrue(reply.path.startswith(self.first.path))
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(self.first.depth, 0)
+
+    def test_post_detail_renders_tree_in_one_query(self):
+        reply = self.reply(self.first, 'Ответ')
+        self.reply(reply, 'Ответ на ответ')
+        self.reply(self.second, 'Ответ второму')
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Первый', 'Ответ', 'Ответ на ответ', 'Второй', 'Ответ второму']
+        )
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'posts_comment' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+
+    def test_reply_to_comment_of_other_post_is_rejected(self):
+        other = Post.objects.create(author=self.user, text='Другой пост')
+        self.assertIsNone(self.reply(self.first, 'Чужой ответ', post=other))
+
+    def test_thread_depth_is_limited(self):
+        parent = self.first
+        for level in range(1, COMMENTS_MAX_DEPTH + 1):
+            reply = self.reply(parent, f'Уровень {level}')
+            self.assertEqual(reply.depth, min(level, COMMENTS_MAX_DEPTH - 1))
+            parent = reply
+        self.assertEqual(reply.parent, Comment.objects.get(
+            text=f'Уровень {COMMENTS_MAX_DEPTH - 2}'
+        ))
+
+    def test_subtree_up_to_depth(self):
+        reply = self.reply(self.first, 'Ответ')
+        self.reply(reply, 'Ответ на ответ')
+        self.reply(self.second, 'Ответ второму')
+        url = reverse('posts:comments', kwargs={'post_id': self.post.id})
+        response = self.client.get(url, {'thread': self.first.pk})
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Ответ', 'Ответ на ответ']
+        )
+        response = self.client.get(
+            url, {'thread': self.first.pk, 'depth': 1}
+        )
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Ответ']
+        )
+
+    def test_reply_form_carries_parent(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertNotContains(self.client.get(url), 'name="parent"')
+        response = self.client.get(url, {'reply_to': self.first.pk})
+        self.assertContains(
+            response,
+            f'<input type="hidden" name="parent" value="{self.first.pk}">'
+        )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_index(self):
+        evict('index')
+        return self.client.get(reverse('posts:index'))
+
+    def test_card_is_cached_until_post_changes(self):
+        self.get_index()
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertContains(self.get_index(), 'Тестовый текст')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        self.assertContains(self.get_index(), 'Тихая правка')
+
+    def test_comment_invalidates_card(self):
+        self.assertContains(self.get_index(), 'еще нет комментариев')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        self.assertNotContains(self.get_index(), 'еще нет комментариев')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth_user')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_placeholder_until_thumbnails_ready(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'data:image/svg+xml')
+        generate(self.post.pk, self.post.image.name)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response, 'data:image/svg+xml')
+                self.assertContains(response, '/media/cache/')
+                self.assertContains(response, ' 320w, ')
+                self.assertContains(response, 'type="image/webp"')
+
+    def test_ready_thumbnails_need_no_lookups(self):
+        generate(self.post.pk, self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, ' 320w, ')
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ])
+
+    def test_card_image_is_lazy_with_dimensions(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
@@ -0,0 +1,128 @@
+"""Миниатюры картинок постов.
+
+Миниатюры известных размеров (THUMBNAIL_SIZES) вместе с более узкими
+вариантами для srcset готовит фоновый пул потоков сразу после
+сохранения поста с новой картинкой и записывает их список в поле
+Post.thumbnails. Шаблоны читают только это поле, без обращений к
+хранилищу миниатюр; пока миниатюр нет, вместо них отдаётся заглушка.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.dispatch import Signal
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from core.metrics import untracked
+from yatube.settings import (
+    THUMBNAIL_FORMATS, THUMBNAIL_SIZES, THUMBNAIL_WIDTHS, THUMBNAIL_WORKERS
+)
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+thumbnails_ready = Signal(providing_args=['post_id'])
+
+FORMATS = tuple(
+    format_ for format_ in THUMBNAIL_FORMATS
+    if format_ != 'WEBP' or features.check('webp')
+)
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+backend = ThumbnailBackend()
+executor = (
+    ThreadPoolExecutor(THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    if THUMBNAIL_WORKERS else None
+)
+
+
+def get_thumbnails(image, size):
+    """Миниатюра размера size и готовые варианты {формат: [(url, ширина)]}.
+
+    Всё берётся из поля Post.thumbnails; пока миниатюры не готовы —
+    заглушка и пустой словарь.
+    """
+    try:
+        ready = json.loads(image.instance.thumbnails)[size]
+    except (ValueError, TypeError, KeyError):
+        ready = None
+    if ready is None:
+        return DummyImageFile(THUMBNAIL_SIZES[size][0]), {}
+    name, width, height = ready['src']
+    thumbnail = ImageFile(name, default.storage)
+    thumbnail.set_size((width, height))
+    variants = {
+        format_: [
+            (default.storage.url(name), width)
+            for name, width in ready['srcset'][format_]
+        ]
+        for format_ in FORMATS if format_ in ready['srcset']
+    }
+    return thumbnail, variants
+
+
+def variants(size):
+    """Форматы, геометрии и опции всех вариантов размера size.
+
+    Ширины идут по возрастанию, последняя — ширина самого размера.
+    """
+    geometry, options = THUMBNAIL_SIZES[size]
+    width, height = map(int, geometry.split('x'))
+    widths = sorted({w for w in THUMBNAIL_WIDTHS if w < width} | {width})
+    for format_ in FORMATS:
+        for variant_width in widths:
+            variant_height = round(height * variant_width / width)
+            yield (
+                format_,
+                f'{variant_width}x{variant_height}',
+                {**options, 'format': format_}
+            )
+
+
+def make(source, size):
+    """Создаёт миниатюру размера size с вариантами и описывает их."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    thumbnail = backend.get_thumbnail(source, geometry, **options)
+    srcset = {}
+    for format_, variant_geometry, variant_options in variants(size):
+        variant = backend.get_thumbnail(
+            source, variant_geometry, **variant_options
+        )
+        srcset.setdefault(format_, []).append([variant.name, variant.width])
+    return {
+        'src': [thumbnail.name, thumbnail.width, thumbnail.height],
+        'srcset': srcset,
+    }
+
+
+def generate(post_id, name):
+    """Создаёт миниатюры всех известных размеров для картинки поста."""
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    try:
+        ready = {size: make(source, size) for size in THUMBNAIL_SIZES}
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    else:
+        # Картинку могли успеть заменить — тогда список уже не её
+        Post.objects.filter(pk=post_id, image=name).update(
+            thumbnails=json.dumps(ready)
+        )
+        thumbnails_ready.send(sender=Post, post_id=post_id)
+    finally:
+        if executor is not None:
+            connections.close_all()
+
+
+def schedule(post_id, name):
+    """Ставит создание миниатюр в очередь фонового пула."""
+    if executor is None:
+        # Работа пула, а не запроса: в бюджет запросов она не входит
+        with untracked():
+            generate(post_id, name)
+    else:
+        executor.submit(generate, post_id, name)
@@ -1,72 +1,119 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
 
-from yatube.settings import PAGINATOR_LIST
+from core.routers import use_primary
+from users.models import get_posts_count
 from yatube.utils import paginator_func
+from .cache import conditional_page, versioned_cache_page
+from .comments import comment_page, reply_parent, subtree
+from .feed import backfill, follow_feed, unfollow
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .search import search_posts
 
 
-@cache_page(20 * 15)
+@conditional_page('index')
+@versioned_cache_page('index')
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed(comments=True)
     context = {
-        'page_obj': paginator_func(request, post_list),
+        'page_obj': paginator_func(request, post_list, keyset=True),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page('group:{slug}')
+@versioned_cache_page('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
     template = 'posts/group_list.html'
     context = {
         'group': group,
-        'page_obj': paginator_func(request, post_list),
+        'page_obj': paginator_func(request, post_list, keyset=True),
     }
     return render(request, template, context)
 
 
+@conditional_page('profile:{username}')
+@versioned_cache_page('profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    post_counter = Paginator(post_list, PAGINATOR_LIST).count
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    post_list = author.posts.for_feed()
+    page_obj = paginator_func(
+        request, post_list, keyset=True, count=get_posts_count(author)
     )
     context = {
         'author': author,
-        'post_counter': post_counter,
-        'following': following,
-        'page_obj': paginator_func(request, post_list),
+        'post_counter': page_obj.paginator.count,
+        'page_obj': page_obj,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page('post:{post_id}')
+@versioned_cache_page('post:{post_id}')
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id)
-    author_posts_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), id=post_id
+    )
+    author_posts_count = get_posts_count(post.author)
+    comments, next_cursor = comment_page(post.pk)
     context = {
         'post': post,
         'author_posts_count': author_posts_count,
-        'form': form
+        'form': form,
+        'comments': comments,
+        'next_cursor': next_cursor,
     }
     return render(request, template, context)
 
 
-@cache_page(20 * 15)
 @login_required
+@versioned_cache_page('post:{post_id}')
+def comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать ещё».
+
+    С ?thread=<id> отдаёт ветку ответов на комментарий целиком
+    или, с ?depth=N, на N уровней вглубь. Как и комментарии на странице
+    поста ({% members_only %}), только для вошедших пользователей.
+    """
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    thread = request.GET.get('thread', '')
+    if thread.isdigit():
+        root = get_object_or_404(
+            Comment.objects.only('post_id', 'path'), pk=thread, post=post
+        )
+        depth = request.GET.get('depth', '')
+        comments = subtree(root, int(depth) if depth.isdigit() else None)
+        next_cursor = None
+    else:
+        comments, next_cursor = comment_page(
+            post.pk, request.GET.get('cursor')
+        )
+    context = {
+        'post': post,
+        'comments': comments,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@login_required
+@use_primary
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', post.author)
     context = {'form': form}
 
@@ -74,6 +121,7 @@ def post_create(request):
 
 
 @login_required
+@use_primary
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -96,6 +144,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@use_primary
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -103,36 +152,52 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        parent_id = request.POST.get('parent', '')
+        if parent_id.isdigit():
+            comment.parent = reply_parent(post, parent_id)
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user).all()
+    post_list, key = follow_feed(request.user)
     context = {
-        'page_obj': paginator_func(request, post_list),
+        'page_obj': paginator_func(request, post_list, keyset=True, key=key),
     }
     return render(request, 'posts/follow.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'query_prefix': urlencode({'q': query}) + '&',
+        'page_obj': (
+            paginator_func(request, search_posts(query)) if query else None
+        ),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@use_primary
 def profile_follow(request, username):
     if request.user.username == username:
         return redirect('posts:profile', username)
     following = get_object_or_404(User, username=username)
-    already_follows = Follow.objects.filter(
-        user=request.user,
-        author=following
-    ).exists()
-    if not already_follows:
-        Follow.objects.create(user=request.user, author=following)
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=request.user, author=following)
+            backfill(request.user, following)
+    except IntegrityError:
+        pass
     return redirect('posts:profile', username)
 
 
 @login_required
+@use_primary
 def profile_unfollow(request, username):
-    following = get_object_or_404(User, username=username)
-    follower = get_object_or_404(Follow, author=following, user=request.user)
-    follower.delete()
+    unfollow(request.user, username)
     return redirect('posts:profile', username)
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('user_id')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def fill_profiles(apps, schema_editor):
+    """Профили всех пользователей с посчитанными постами и подписчиками."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('users', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    alias = schema_editor.connection.alias
+    profiles = Profile.objects.using(alias)
+    profiles.bulk_create(
+        Profile(user_id=user_id)
+        for user_id in User.objects.using(alias).filter(
+            profile__isnull=True
+        ).values_list('pk', flat=True)
+    )
+    profiles.update(
+        posts_count=count_subquery(Post.objects.using(alias), 'author'),
+        followers_count=count_subquery(Follow.objects.using(alias), 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile'),
+        ('posts', '0013_auto_20261018_0500'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число подписчиков'),
+        ),
+        migrations.RunPython(fill_profiles, migrations.RunPython.noop),
+    ]
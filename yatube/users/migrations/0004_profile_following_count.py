@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_following_counts(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    Follow = apps.get_model('posts', 'Follow')
+    alias = schema_editor.connection.alias
+    Profile.objects.using(alias).update(following_count=Coalesce(Subquery(
+        Follow.objects.using(alias).filter(user=OuterRef('user_id'))
+        .order_by()
+        .values('user')
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile_followers_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число подписок'),
+        ),
+        migrations.RunPython(
+            fill_following_counts, migrations.RunPython.noop
+        ),
+    ]
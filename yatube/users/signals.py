@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Profile
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    # Профиль есть у каждого пользователя: счётчики в нём меняются
+    # одним UPDATE, без проверки, создан ли он
+    if created and not raw:
+        Profile.objects.create(user=instance)
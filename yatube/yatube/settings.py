@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +26,8 @@ SECRET_KEY = 'vffz0#pct%wm#03zlqv@=td$286+mr^k&h!n857q)0=(*&6*q+'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Идёт прогон тестов (manage.py test или pytest)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -52,6 +55,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,7 +81,7 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -104,7 +109,133 @@ DATABASES = {
     }
 }
 
+# Рабочий режим SQLite: WAL (читатели не блокируют писателя), ожидание
+# блокировки вместо «database is locked» и постоянные соединения.
+# По умолчанию включён без DEBUG, явно — SQLITE_TUNING=1/0
+SQLITE_TUNING = bool(int(os.environ.get('SQLITE_TUNING', not DEBUG)))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+if SQLITE_TUNING:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.environ.get('CONN_MAX_AGE', 60)
+    )
+
+# Реплики только для чтения, например
+# DATABASE_REPLICAS=/data/replica1.sqlite3,/data/replica2.sqlite3.
+# Реплика может отставать от основной базы не больше чем на REPLICA_LAG
+# секунд: столько после записи пользователь читает из основной базы
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+# В тестах отдельная база изображает отстающую реплику: в неё ничего
+# не копируется. Маршрутизатор читает с неё, только если тест подставит
+# её в ReplicaRouter.replicas (core.tests.ReplicaRoutingTests)
+if TESTING:
+    DATABASES['lagging_replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'lagging_replica.sqlite3'),
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_LAG = 5
+REPLICA_STICKY_COOKIE = 'use_primary'
+
+# Сколько SQL-запросов может сделать представление (с учётом сессии
+# и пользователя) на страницах с картинками, ответами и промахом кэша.
+# Это худший путь: ?page= за концом ленты, пока число записей не
+# известно, стоит ещё одного COUNT(*). В тестах транзакция представления
+# — это SAVEPOINT и RELEASE, так что запись стоит на запрос больше.
+# Превышение пишется в лог, а в строгом режиме (по умолчанию в тестах) —
+# ошибка, на которой тест падает
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:group_list': 6,
+    'posts:profile': 7,
+    'posts:post_detail': 4,
+    'posts:follow_index': 7,
+    'posts:search': 6,
+    'posts:create_post': 15,
+    'posts:post_edit': 10,
+    'posts:add_comment': 9,
+    'posts:comments': 5,
+}
+QUERY_BUDGETS_STRICT = bool(int(
+    os.environ.get('QUERY_BUDGETS_STRICT', TESTING)
+))
+
+# Нагрузочный тест (manage.py benchmark_posts): доли представлений
+# в смеси запросов и каталог, где хранятся результаты прогонов
+BENCHMARK_MIX = {
+    'index': 30,
+    'group_posts': 15,
+    'profile': 15,
+    'post_detail': 25,
+    'follow_index': 10,
+    'add_comment': 5,
+}
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'benchmarks')
+
 PAGINATOR_LIST = 10
+# Комментарии к посту показываются и догружаются по столько штук
+COMMENTS_PER_PAGE = 20
+# Уровней в дереве ответов; ответ на самом глубоком встаёт рядом с ним
+COMMENTS_MAX_DEPTH = 6
+# Сколько секунд можно показывать закэшированное число записей ленты
+PAGINATOR_COUNT_TIMEOUT = 60
+# Лента подписок хранится по читателям (fan-out on write); у авторов,
+# у которых подписчиков больше порога, посты подмешиваются при чтении
+FEED_FANOUT = True
+FEED_FANOUT_THRESHOLD = 1000
+# Страницы лент сбрасываются при изменениях, поэтому их можно хранить долго
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Срок жизни страницы случайно сокращается на долю до PAGE_CACHE_JITTER,
+# чтобы страницы не истекали разом. Ещё PAGE_CACHE_STALE секунд после
+# истечения или сброса страницу можно отдавать, пока один процесс под
+# блокировкой на PAGE_CACHE_LOCK_TIMEOUT секунд готовит новую
+PAGE_CACHE_JITTER = 0.1
+PAGE_CACHE_STALE = 5 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 10
+# Загруженные картинки уменьшаются до IMAGE_MAX_SIZE по большей стороне
+# и пересохраняются без метаданных
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 85
+# media_gc не удаляет файлы без ссылок моложе стольких секунд
+MEDIA_GC_GRACE = 60 * 60
+# Миниатюры этих размеров готовятся в фоне сразу после загрузки картинки;
+# THUMBNAIL_WORKERS=0 — готовить их в потоке запроса (так по умолчанию
+# в тестах, чтобы фоновые потоки не переживали тестовую базу)
+THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('820x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = int(
+    os.environ.get('THUMBNAIL_WORKERS', 0 if TESTING else 2)
+)
+# Для srcset каждая миниатюра режется ещё и до этих ширин, во всех
+# форматах (WebP — если его поддерживает Pillow); последний формат —
+# запасной для браузеров, которые не понимают остальные
+THUMBNAIL_WIDTHS = (320, 480, 640)
+THUMBNAIL_FORMATS = ('WEBP', 'JPEG')
+# Заглушка, которая показывается, пока миниатюра не готова
+THUMBNAIL_DUMMY_SOURCE = (
+    "data:image/svg+xml,%%3Csvg xmlns='http://www.w3.org/2000/svg' "
+    "width='%(width)s' height='%(height)s'%%3E%%3Crect width='100%%25' "
+    "height='100%%25' fill='%%23e9ecef'/%%3E%%3C/svg%%3E"
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -144,8 +275,40 @@ USE_TZ = True
 STATIC_URL = '/static/'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Кэш общий для всех процессов: CACHE_BACKEND=memcached (python-memcached)
+# или redis (django-redis). Блокировка перегенерации страниц и версии
+# областей (posts.cache) рассчитаны на то, что add и incr атомарны для
+# всех воркеров сразу; core.tests.SharedCacheContractTests проверяет это
+# на заглушке сервера memcached. file и locmem этому не отвечают: в file
+# add и incr — чтение и запись файла, и при нескольких воркерах сбросы
+# теряются, а страницу готовят сразу несколько из них; locmem у каждого
+# воркера свой. Они годятся для разработки, тестов и одного процесса.
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', 'redis://127.0.0.1:6379/1'
+        ),
+    },
+}
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        **CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')],
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', 1)),
     }
 }
@@ -1,10 +1,259 @@
-from django.core.paginator import Paginator
+import base64
+import hashlib
+import json
+from contextlib import suppress
 
-from yatube.settings import PAGINATOR_LIST
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
+from yatube.settings import PAGINATOR_COUNT_TIMEOUT, PAGINATOR_LIST
 
-def paginator_func(request, post_list):
-    paginator = Paginator(post_list, PAGINATOR_LIST)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+ELLIPSIS = '…'
+
+
+class KeysetPage(Page):
+    """Страница, полученная по курсору, а не по номеру.
+
+    Номера страницы и общего числа записей у неё нет, поэтому
+    has_next/has_previous считаются по лишней выбранной записи.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор без COUNT(*) на каждый запрос.
+
+    Общее число записей берётся из переданного счётчика (count=) или из
+    кэша, который живёт PAGINATOR_COUNT_TIMEOUT секунд. Страница выбирается
+    с одной лишней записью: по ней понятно, есть ли следующая страница,
+    а на последней странице точное число записей известно без подсчёта.
+    """
+
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, count=None,
+                 timeout=PAGINATOR_COUNT_TIMEOUT, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.timeout = timeout
+        if count is not None:
+            self._set_count(count, store=False)
+
+    @cached_property
+    def cache_key(self):
+        query = str(self.object_list.query).encode()
+        return 'paginator_count:' + hashlib.md5(query).hexdigest()
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, self.timeout)
+        return count
+
+    def known_count(self):
+        """Число записей, если его можно узнать без COUNT(*)."""
+        count = self.__dict__.get('count')
+        return cache.get(self.cache_key) if count is None else count
+
+    def _set_count(self, count, store=True):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        if store:
+            cache.set(self.cache_key, count, self.timeout)
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            return super().validate_number(number)
+        if number < 1:
+            return super().validate_number(number)
+        return number
+
+    def get_page(self, number):
+        # Номер за концом ленты при известном числе записей сразу
+        # становится последней страницей, без пустой выборки и подсчёта
+        known = self.known_count()
+        if known is not None:
+            self._set_count(known, store=False)
+            with suppress(TypeError, ValueError):
+                number = min(int(number), self.num_pages)
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            self._set_count(Paginator(self.object_list, self.per_page).count)
+            return self.page(self.num_pages)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            seen = bottom + self.per_page + 1
+            known = self.known_count()
+            if known is not None and known < seen:
+                self._set_count(seen)
+        elif rows or number == 1:
+            self._set_count(bottom + len(rows))
+        else:
+            raise EmptyPage('That page contains no results')
+        return self._get_page(rows, number, self)
+
+
+class KeysetPaginator(CachedCountPaginator):
+    """Пагинатор по ключу (pub_date, id) вместо OFFSET/LIMIT.
+
+    Стоимость любой страницы такая же, как у первой: выборка идёт
+    по условию на ключ последней показанной записи. key — имена полей
+    с датой и id поста, если их выгоднее брать не из самого поста
+    (лента подписок читает их из записей ленты).
+    """
+
+    key = ('pub_date', 'pk')
+
+    def __init__(self, object_list, per_page, count=None, key=None,
+                 **kwargs):
+        if key is not None:
+            self.key = key
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, count, **kwargs
+        )
+
+    @property
+    def ordering(self):
+        return tuple(f'-{field}' for field in self.key)
+
+    def cursor_page(self, cursor):
+        try:
+            direction, pub_date, pk = self.decode_cursor(cursor)
+        except ValueError:
+            return self.get_page(None)
+        date_field, pk_field = self.key
+        # Условие на одну дату отдельно от OR: по нему СУБД сужает
+        # диапазон индекса, а не просматривает его с начала
+        after = Q(**{f'{date_field}__lte': pub_date}) & (
+            Q(**{f'{date_field}__lt': pub_date}) | Q(**{f'{pk_field}__lt': pk})
+        )
+        before = Q(**{f'{date_field}__gte': pub_date}) & (
+            Q(**{f'{date_field}__gt': pub_date}) | Q(**{f'{pk_field}__gt': pk})
+        )
+        if direction == 'next':
+            rows = list(
+                self.object_list.filter(after)
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, True
+        else:
+            rows = list(
+                self.object_list.filter(before)
+                .order_by(*self.key)[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+        return KeysetPage(
+            rows,
+            self,
+            self.encode_cursor('next', rows[-1]) if rows and has_next
+            else None,
+            self.encode_cursor('previous', rows[0]) if rows and has_previous
+            else None,
+        )
+
+    @staticmethod
+    def encode_cursor(direction, post):
+        raw = json.dumps([direction, post.pub_date.isoformat(), post.pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, pub_date, pk = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+            pub_date = parse_datetime(pub_date)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValueError('Некорректный курсор страницы')
+        if (
+            direction not in ('next', 'previous')
+            or pub_date is None
+            or not isinstance(pk, int)
+        ):
+            raise ValueError('Некорректный курсор страницы')
+        return direction, pub_date, pk
+
+
+def elided_page_range(page_obj, on_each_side=3, on_ends=2):
+    """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS.
+
+    Число ссылок не зависит от количества страниц в ленте.
+    """
+    number = page_obj.number
+    num_pages = page_obj.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from range(1, num_pages + 1)
+        return
+    if number > 1 + on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield ELLIPSIS
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield ELLIPSIS
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def paginator_func(request, post_list, keyset=False, count=None, key=None):
+    """Возвращает страницу ленты.
+
+    С keyset=True переход по ссылкам «Следующая»/«Предыдущая» идёт по
+    непрозрачному ?cursor=, а ?page= остаётся для прямых ссылок.
+    count — заранее известное число записей, если оно хранится отдельно,
+    key — поля ключа страниц, если они не (pub_date, pk) самого поста.
+    """
+    if not keyset:
+        paginator = CachedCountPaginator(post_list, PAGINATOR_LIST, count)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = KeysetPaginator(post_list, PAGINATOR_LIST, count, key=key)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.cursor_page(cursor)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = list(page_obj.object_list)
+    page_obj.object_list = posts
+    page_obj.next_cursor = (
+        paginator.encode_cursor('next', posts[-1])
+        if posts and page_obj.has_next() else None
+    )
+    page_obj.previous_cursor = (
+        paginator.encode_cursor('previous', posts[0])
+        if posts and page_obj.has_previous() else None
+    )
     return page_obj